@@ -1,54 +1,108 @@
-import random
 import time
-import copy
 import tkinter as tk
 from tkinter import messagebox, ttk
 import math
+import os
+import sys
+from collections import deque
+
+import bitboard
+from game_engine import GameEngine, MISSION_KINDS
+from events import EventBus, MissionCompleted, GameOver, TimeUp
+from hint_engine import BackgroundHintSearch, ParallelHintSearch
+from canvas_board import CanvasBoard
+from replay import ReplayWriter, REPLAY_PATH
+from stats import StatsStore, STATS_PATH
+from profiler import MoveProfiler
+
+# Emoji shown in front of the value of special tiles
+SPECIAL_ICONS = {'bomb': "💣", 'swapper': "🌀", 'frozen': "🧊"}
+
+KEY_DIRECTIONS = {"Up": "Up", "w": "Up", "Down": "Down", "s": "Down",
+                  "Left": "Left", "a": "Left", "Right": "Right", "d": "Right"}
+# Moves waiting to be played; past this many the oldest are dropped, so holding
+# a key down can't build up a backlog that plays on after it is released
+INPUT_QUEUE_DEPTH = 4
+# At most one repaint per display frame, however many moves were played in it
+FRAME_MS = 16
+# Engine events show as toasts over the board: how long one stays up, and how many at once.
+# Game over and time up stay until the next game.
+TOAST_MS = 3000
+MAX_TOASTS = 3
+STICKY_EVENTS = (GameOver, TimeUp)
 
 class Game2048:
-    def __init__(self, master):
+    def __init__(self, master, renderer="labels", replay_path=REPLAY_PATH, profile=False, grid_size=4,
+                 input_depth=INPUT_QUEUE_DEPTH, stats_path=STATS_PATH):
         self.master = master
         self.master.title("Enhanced 2048")
-        self.master.geometry("600x750")
         self.master.resizable(False, False)
         
+        # The 4x4 move tables take a while to build without move_tables.bin; moves
+        # use the list rules until this background load is done
+        bitboard.preload_tables()
+        
+        # Game rules and state live in the headless engine
+        self.engine = GameEngine(grid_size)
+        # Milestones (2048, chaos, missions, game over) come back as events, shown as toasts
+        self.engine.events = EventBus()
+        self.engine.events.subscribe_all(self.queue_event)
+        # Every game is appended to a replay log (seed + moves), unless replay_path is None
+        self.recorder = ReplayWriter(replay_path) if replay_path else None
+        self.engine.recorder = self.recorder
+        # Finished games, high scores and missions go to a stats database, written
+        # by a background thread (see stats.py), unless stats_path is None
+        self.stats = StatsStore(stats_path) if stats_path else None
+        self.stats_job = None
+        if self.stats is not None:
+            self.engine.events.subscribe(MissionCompleted, self.stats.mission_completed)
+        # Hints are searched off the Tk thread: a process pool on multi-core machines, else a thread.
+        # The pool starts its workers now, so the first hint isn't spent waiting for them.
+        if (os.cpu_count() or 1) > 1:
+            self.hint_search = ParallelHintSearch()
+            self.hint_search.warm_up()
+        else:
+            self.hint_search = BackgroundHintSearch()
+        self.hint_job = None
+        
         # Game constants
-        self.GRID_SIZE = 4
-        self.CELL_SIZE = 100
-        self.CELL_PADDING = 10
-        
-        # Game variables
-        self.score = 0
-        self.high_score = 0
-        self.moves = 0
-        self.game_over = False
-        self.game_won = False
-        self.time_left = 60  # For timed mode
-        self.timed_mode = False
+        self.GRID_SIZE = self.engine.GRID_SIZE
+        # Cells shrink on bigger boards, so the board takes about the same room at any size
+        self.CELL_SIZE = min(100, 400 // self.GRID_SIZE)
+        self.CELL_PADDING = max(1, self.CELL_SIZE // 10)
+        
+        # 600x750 for the classic 4x4 board; the controls need 600px across
+        board_side = self.GRID_SIZE * (self.CELL_SIZE + 4 * self.CELL_PADDING) + 40
+        self.master.geometry(f"{max(600, board_side)}x{board_side + 150}")
+        
+        # Timer loop for timed mode
         self.timer_running = False
         
-        # Undo feature
-        self.undo_limit = 3
-        self.undo_count = self.undo_limit
-        self.previous_states = []
-        
-        # Features
-        self.chaos_mode = False
-        self.chaos_frequency = 10  # Trigger chaos every X moves
-        
-        # Special tiles
-        self.special_tiles = {}  # (row, col): {'type': 'bomb', 'turns': 3}
-        self.special_types = ['bomb', 'swapper', 'frozen']
-        self.special_chance = 0.08  # 8% chance of a special tile
-        
-        # Missions
-        self.missions = [
-            {"description": "Merge a 64 tile", "goal_value": 64, "type": "merge", "completed": False},
-            {"description": "Make 3 merges in one move", "goal_value": 3, "type": "combo", "completed": False},
-            {"description": "Reach 500 points", "goal_value": 500, "type": "score", "completed": False}
-        ]
-        self.current_mission = random.choice(self.missions)
-        self.combo_count = 0
+        # Key presses only queue moves; process_input plays them when Tk is idle
+        # and render_frame repaints once for everything played since the last frame
+        self.input_queue = deque(maxlen=input_depth)
+        self.input_job = None
+        self.render_job = None
+        self.last_render = 0.0
+        self.frame_moves = 0  # moves played since the last repaint
+        self.frame_paths = None  # slide paths to animate, when only one move was played
+        self.frame_events = []  # engine events to toast with the next repaint
+        self.toasts = []  # toast labels on screen, oldest first
+        
+        # Board drawing: "labels" is a Label per cell, "canvas" draws on one
+        # animated Canvas (see canvas_board.py)
+        self.renderer = renderer
+        self.board = None
+        
+        # Per-phase move timing and its overlay, toggled with F3 (None when off)
+        self.profiler = None
+        self.profile_overlay = None
+        self.profile_after_id = None
+        self.profile_status = ""
+        
+        # Last (value, special type) drawn in each cell and the theme it was drawn with
+        self.tile_styles = {}
+        self.invalidate_grid_display()
         
         # Theme variables
         self.themes = {
@@ -115,22 +169,32 @@ class Game2048:
         }
         self.current_theme = "Classic"
         
-        # Initialize grid
-        self.grid = [[0 for _ in range(self.GRID_SIZE)] for _ in range(self.GRID_SIZE)]
-        
         # Create UI
         self.create_widgets()
         
         # Start new game
         self.new_game()
+        # The saved high scores show up once the stats writer has loaded them
+        if self.stats is not None:
+            self.poll_stats()
+        
+        # Finish the replay log and stop hint workers when the window closes
+        self.master.protocol("WM_DELETE_WINDOW", self.close)
         
         # Bind keys
         self.master.bind("<Key>", self.key_press)
                 # keyboard shortcut: T to cycle themes
         self.master.bind("<t>", self._cycle_theme)
         self.master.bind("<T>", self._cycle_theme)
+        # F3: move timing overlay, F4: save the timings as JSON and CSV
+        self.master.bind("<F3>", self.toggle_profiler)
+        self.master.bind("<F4>", self.dump_profile)
+        if profile:
+            self.toggle_profiler()
 
     def _cycle_theme(self, event):
+        if event.widget is self.seed_entry:
+            return  # typing in the seed box
         keys = list(self.themes.keys())
         idx = keys.index(self.current_theme)
         new = keys[(idx + 1) % len(keys)]
@@ -177,13 +241,21 @@ class Game2048:
                                     command=self.new_game, relief="flat", padx=10, pady=5)
         self.new_game_btn.grid(row=0, column=0, padx=5)
         
-        self.undo_btn = tk.Button(self.controls_frame, text=f"Undo ({self.undo_count})", font=("Arial", 12), bg="#8f7a66", fg="#ffffff", 
+        self.undo_btn = tk.Button(self.controls_frame, text=f"Undo ({self.engine.undo_count})", font=("Arial", 12), bg="#8f7a66", fg="#ffffff", 
                                 command=self.undo_move, relief="flat", padx=10, pady=5)
         self.undo_btn.grid(row=0, column=1, padx=5)
         
+        self.redo_btn = tk.Button(self.controls_frame, text="Redo", font=("Arial", 12), bg="#8f7a66", fg="#ffffff", 
+                                command=self.redo_move, relief="flat", padx=10, pady=5)
+        self.redo_btn.grid(row=0, column=2, padx=5)
+        
         self.hint_btn = tk.Button(self.controls_frame, text="Hint", font=("Arial", 12), bg="#8f7a66", fg="#ffffff", 
                                 command=self.get_hint, relief="flat", padx=10, pady=5)
-        self.hint_btn.grid(row=0, column=2, padx=5)
+        self.hint_btn.grid(row=0, column=3, padx=5)
+        
+        # Best hint found so far, updated while the search deepens
+        self.hint_label = tk.Label(self.controls_frame, text="", font=("Arial", 12), bg="#faf8ef", fg="#776e65")
+        self.hint_label.grid(row=0, column=4, padx=10)
         
         # Toggle features
         self.features_frame = tk.Frame(self.master, bg="#faf8ef")
@@ -214,17 +286,25 @@ class Game2048:
         self._highlight_active_swatch()
         
         # Chaos mode toggle
-        self.chaos_var = tk.BooleanVar(value=self.chaos_mode)
+        self.chaos_var = tk.BooleanVar(value=self.engine.chaos_mode)
         self.chaos_check = tk.Checkbutton(self.features_frame, text="Chaos Mode", variable=self.chaos_var, 
                                         font=("Arial", 12), bg="#faf8ef", fg="#776e65", command=self.toggle_chaos)
         self.chaos_check.grid(row=0, column=2, padx=10)
         
         # Timed mode toggle
-        self.timed_var = tk.BooleanVar(value=self.timed_mode)
+        self.timed_var = tk.BooleanVar(value=self.engine.timed_mode)
         self.timed_check = tk.Checkbutton(self.features_frame, text="Timed Mode", variable=self.timed_var, 
                                         font=("Arial", 12), bg="#faf8ef", fg="#776e65", command=self.toggle_timed)
         self.timed_check.grid(row=0, column=3, padx=10)
         
+        # Seed of the current game; type one in and press Play Seed to replay it
+        self.seed_var = tk.StringVar(value=str(self.engine.seed))
+        self.seed_entry = tk.Entry(self.features_frame, textvariable=self.seed_var, width=11, font=("Arial", 12))
+        self.seed_entry.grid(row=0, column=4, padx=5)
+        self.seed_btn = tk.Button(self.features_frame, text="Play Seed", font=("Arial", 12), bg="#8f7a66", fg="#ffffff",
+                                command=self.play_seed, relief="flat", padx=10, pady=5)
+        self.seed_btn.grid(row=0, column=5, padx=5)
+        
         # Mission display
         self.mission_frame = tk.Frame(self.master, bg="#faf8ef", padx=10, pady=5)
         self.mission_frame.pack(fill="x", padx=10, pady=5)
@@ -239,13 +319,32 @@ class Game2048:
         
         # Create game grid cells
         self.cells = []
+        if self.renderer == "canvas":
+            self.board = CanvasBoard(self.canvas_frame, self.GRID_SIZE, self.CELL_SIZE, self.CELL_PADDING,
+                                     self.tile_style)
+        else:
+            self.create_cells()
+            
+        # Instructions
+        self.instructions_frame = tk.Frame(self.master, bg="#faf8ef", padx=10, pady=5)
+        self.instructions_frame.pack(fill="x", padx=10, pady=5)
+        
+        instructions_text = "How to play: Use arrow keys to move tiles. When two tiles with the same number touch, they merge!"
+        instructions_text += "\nSpecial tiles: 💣 Bomb (clears surrounding), 🌀 Swapper (swaps with adjacent), 🧊 Frozen (can't move)"
+        
+        self.instructions_label = tk.Label(self.instructions_frame, text=instructions_text, 
+                                         font=("Arial", 10), bg="#faf8ef", fg="#776e65", justify="left")
+        self.instructions_label.pack(anchor="w")
+        
+    def create_cells(self):
+        # One Frame + Label per cell, for the label renderer
         for i in range(self.GRID_SIZE):
             row = []
             for j in range(self.GRID_SIZE):
                 cell_frame = tk.Frame(self.canvas_frame, width=self.CELL_SIZE, height=self.CELL_SIZE, 
                                     bg="#cdc1b4", padx=self.CELL_PADDING, pady=self.CELL_PADDING)
                 cell_frame.grid(row=i, column=j, padx=self.CELL_PADDING, pady=self.CELL_PADDING)
-                cell_number = tk.Label(cell_frame, text="", font=("Arial", 24, "bold"), bg="#cdc1b4", fg="#776e65")
+                cell_number = tk.Label(cell_frame, text="", font=self.tile_style(0, None)[1], bg="#cdc1b4", fg="#776e65")
                 cell_number.place(relx=0.5, rely=0.5, anchor="center")
                 row.append(cell_number)
             self.cells.append(row)
@@ -254,17 +353,6 @@ class Game2048:
         for i in range(self.GRID_SIZE):
             self.canvas_frame.grid_rowconfigure(i, minsize=self.CELL_SIZE + 2*self.CELL_PADDING)
             self.canvas_frame.grid_columnconfigure(i, minsize=self.CELL_SIZE + 2*self.CELL_PADDING)
-            
-        # Instructions
-        self.instructions_frame = tk.Frame(self.master, bg="#faf8ef", padx=10, pady=5)
-        self.instructions_frame.pack(fill="x", padx=10, pady=5)
-        
-        instructions_text = "How to play: Use arrow keys to move tiles. When two tiles with the same number touch, they merge!"
-        instructions_text += "\nSpecial tiles: 💣 Bomb (clears surrounding), 🌀 Swapper (swaps with adjacent), 🧊 Frozen (can't move)"
-        
-        self.instructions_label = tk.Label(self.instructions_frame, text=instructions_text, 
-                                         font=("Arial", 10), bg="#faf8ef", fg="#776e65", justify="left")
-        self.instructions_label.pack(anchor="w")
     def _highlight_active_swatch(self):
         for name, btn in self.theme_buttons.items():
             if name == self.current_theme:
@@ -272,660 +360,433 @@ class Game2048:
             else:
                 btn.config(relief="raised", bd=2)
 
-    def new_game(self):
-        # Reset game variables
-        self.grid = [[0 for _ in range(self.GRID_SIZE)] for _ in range(self.GRID_SIZE)]
-        self.score = 0
-        self.moves = 0
-        self.game_over = False
-        self.game_won = False
-        self.special_tiles = {}
-        self.combo_count = 0
-        self.update_score_display()
-        
-        # Reset undo
-        self.previous_states = []
-        self.undo_count = self.undo_limit
-        self.undo_btn.config(text=f"Undo ({self.undo_count})")
+    def new_game(self, seed=None):
+        # Reset the rules engine (grid, score, undo, mission and initial tiles)
+        self.drop_input()
+        self.clear_toasts()
+        self.cancel_hint()
+        if self.stats is not None:
+            # Record the game being left before the engine resets it
+            self.stats.end_game()
+        self.engine.new_game(seed)
+        if self.stats is not None:
+            self.stats.start_game(self.engine)
+        self.seed_var.set(str(self.engine.seed))
+        self.master.focus_set()  # arrow keys go to the game, not the seed entry
+        self.load_high_score()
+        self.undo_btn.config(text=f"Undo ({self.engine.undo_count})")
         
         # Reset time if timed mode
-        self.time_left = 60
-        self.time_label.config(text=str(self.time_left))
-        if self.timed_mode and not self.timer_running:
+        self.time_label.config(text=str(self.engine.time_left))
+        if self.engine.timed_mode and not self.timer_running:
             self.timer_running = True
             self.update_timer()
         
-        # Pick a random mission
-        self.current_mission = random.choice(self.missions)
-        self.current_mission["completed"] = False
         self.update_mission_display()
         
-        # Add initial tiles
-        self.add_new_tile()
-        self.add_new_tile()
-        
         # Update the display
         self.update_grid_display()
         
-    def add_new_tile(self):
-        # Find all empty cells
-        empty_cells = [(i, j) for i in range(self.GRID_SIZE) for j in range(self.GRID_SIZE) if self.grid[i][j] == 0]
+    def tile_style(self, cell_value, special_type):
+        # (text, font, fg, bg) for a cell, cached per theme since only a few dozen combinations occur
+        key = (self.current_theme, cell_value, special_type)
+        style = self.tile_styles.get(key)
+        if style is not None:
+            return style
+        theme = self.themes[self.current_theme]
         
-        if not empty_cells:
-            return False
-            
-        # Choose random empty cell
-        i, j = random.choice(empty_cells)
-        
-        # 90% chance for 2, 10% chance for 4
-        self.grid[i][j] = 2 if random.random() < 0.9 else 4
-        
-        # Check if we should make it a special tile
-        if random.random() < self.special_chance:
-            special_type = random.choice(self.special_types)
-            self.special_tiles[(i, j)] = {
-                'type': special_type,
-                'turns': 3 if special_type == 'frozen' else -1  # Frozen lasts 3 turns, others until used
-            }
+        # Adjust font size based on value, and scale it with the cells
+        if cell_value < 100:
+            font_size = 24
+        elif cell_value < 1000:
+            font_size = 20
+        else:
+            font_size = 16
+        font_size = max(6, round(font_size * self.CELL_SIZE / 100))
+        
+        if special_type is not None:
+            if cell_value == 0:
+                cell_text = ""
+            elif special_type in SPECIAL_ICONS:
+                # Display text with emoji prefix
+                cell_text = f"{SPECIAL_ICONS[special_type]} {cell_value}"
+            else:
+                cell_text = str(cell_value)
+            # Set colors based on special tile type
+            fg, bg = theme["colors"].get(special_type, ("#ffffff", "#000000"))
+        elif cell_value == 0:
+            cell_text = ""
+            fg, bg = "#776e65", theme["empty"]
+        else:
+            cell_text = str(cell_value)
+            # Get colors from theme
+            fg, bg = theme["colors"].get(cell_value, ("#f9f6f2", "#3c3a32"))
+        
+        style = self.tile_styles[key] = (cell_text, ("Arial", font_size, "bold"), fg, bg)
+        return style
+        
+    def invalidate_grid_display(self):
+        # Forget what the cells show, so the next update repaints all of them
+        self.rendered = [[None] * self.GRID_SIZE for _ in range(self.GRID_SIZE)]
+        self.rendered_theme = None
+        if self.board is not None:
+            self.board.invalidate()
+        
+    def update_grid_display(self, paths=None):
+        # paths (GameEngine.slide_paths from before a move) animate the change on the canvas renderer
+        if self.board is not None:
+            theme = self.themes[self.current_theme]
+            self.board.render(self.engine.grid, self.engine.special_tiles, self.current_theme,
+                              theme["bg"], theme["empty"], paths)
+            return
         
-        return True
+        # Only cells whose (value, special type) changed since the last call are reconfigured
+        if self.rendered_theme != self.current_theme:
+            self.invalidate_grid_display()
+            self.rendered_theme = self.current_theme
+            # Update canvas background
+            self.canvas_frame.config(bg=self.themes[self.current_theme]["bg"])
         
-    def update_grid_display(self):
-        theme = self.themes[self.current_theme]
+        grid = self.engine.grid
+        special_tiles = self.engine.special_tiles
+        rendered = self.rendered
         
         for i in range(self.GRID_SIZE):
+            row = grid[i]
+            rendered_row = rendered[i]
             for j in range(self.GRID_SIZE):
-                cell = self.cells[i][j]
-                cell_value = self.grid[i][j]
-                
-                if (i, j) in self.special_tiles:
-                    special_type = self.special_tiles[(i, j)]['type']
-                    # Adjust font size based on value
-                    if cell_value == 0:
-                        font_size = 24
-                        cell_text = ""
-                    else:
-                        if cell_value < 100:
-                            font_size = 24
-                        elif cell_value < 1000:
-                            font_size = 20
-                        else:
-                            font_size = 16
-                        
-                        # Display text with emoji prefix
-                        if special_type == 'bomb':
-                            cell_text = f"💣 {cell_value}"
-                        elif special_type == 'swapper':
-                            cell_text = f"🌀 {cell_value}"
-                        elif special_type == 'frozen':
-                            cell_text = f"🧊 {cell_value}"
-                        else:
-                            cell_text = str(cell_value)
-                    
-                    # Set colors based on special tile type
-                    fg, bg = theme["colors"].get(special_type, ("#ffffff", "#000000"))
-                else:
-                    # Normal tiles
-                    if cell_value == 0:
-                        font_size = 24
-                        cell_text = ""
-                        fg, bg = "#776e65", theme["empty"]
-                    else:
-                        # Adjust font size based on value
-                        if cell_value < 100:
-                            font_size = 24
-                        elif cell_value < 1000:
-                            font_size = 20
-                        else:
-                            font_size = 16
-                        
-                        cell_text = str(cell_value)
-                        # Get colors from theme
-                        fg, bg = theme["colors"].get(cell_value, ("#f9f6f2", "#3c3a32"))
+                special = special_tiles.get((i, j))
+                state = (row[j], special['type'] if special else None)
+                if rendered_row[j] == state:
+                    continue
+                rendered_row[j] = state
                 
-                cell.config(text=cell_text, font=("Arial", font_size, "bold"), bg=bg, fg=fg)
+                cell_text, font, fg, bg = self.tile_style(*state)
+                cell = self.cells[i][j]
+                cell.config(text=cell_text, font=font, bg=bg, fg=fg)
                 cell.master.config(bg=bg)
         
-        # Update canvas background
-        self.canvas_frame.config(bg=theme["bg"])
-        
-    def key_press(self, event):
-        if self.game_over:
+    def toggle_profiler(self, event=None):
+        if self.profiler is not None:
+            # Off again: detach so moves don't pay for timing
+            self.profiler = self.engine.profiler = None
+            if self.profile_after_id is not None:
+                self.master.after_cancel(self.profile_after_id)
+                self.profile_after_id = None
+            self.profile_overlay.destroy()
+            self.profile_overlay = None
             return
             
-        # Save current state for undo
-        self.save_state()
-        
-        key = event.keysym
-        moved = False
-        self.combo_count = 0  # Reset combo counter for mission tracking
-        
-        if key == "Up" or key == "w":
-            moved = self.move_up()
-        elif key == "Down" or key == "s":
-            moved = self.move_down()
-        elif key == "Left" or key == "a":
-            moved = self.move_left()
-        elif key == "Right" or key == "d":
-            moved = self.move_right()
-            
-        if moved:
-            # Update moves counter
-            self.moves += 1
-            
-            # Add new tile
-            self.add_new_tile()
-            
-            # Update turns for time-limited special tiles
-            self.update_special_tiles()
-            
-            # Check for chaos mode
-            if self.chaos_mode and self.moves % self.chaos_frequency == 0:
-                self.trigger_chaos_event()
-            
-            # Check missions
-            self.check_missions()
-            
-            # Update display
-            self.update_grid_display()
-            
-            # Check game over
-            if self.check_game_over():
-                self.game_over = True
-                messagebox.showinfo("Game Over", f"Game Over! Your score: {self.score}")
-                
-    def move_up(self):
-        moved = False
-        for j in range(self.GRID_SIZE):
-            # Process each column
-            column = [self.grid[i][j] for i in range(self.GRID_SIZE)]
-            frozen_cells = [i for i in range(self.GRID_SIZE) if (i, j) in self.special_tiles and 
-                            self.special_tiles[(i, j)]['type'] == 'frozen']
-            
-            new_column, merged, combo = self.compress_and_merge(column, frozen_cells)
-            self.combo_count += combo
-            
-            if column != new_column:
-                moved = True
-                # Update grid with new values
-                for i in range(self.GRID_SIZE):
-                    self.grid[i][j] = new_column[i]
-                    
-                # Apply special tile effects
-                if merged:
-                    self.apply_special_tile_effects()
-                    
-        return moved
-        
-    def move_down(self):
-        moved = False
-        for j in range(self.GRID_SIZE):
-            # Process each column bottom to top
-            column = [self.grid[i][j] for i in range(self.GRID_SIZE)]
-            frozen_cells = [i for i in range(self.GRID_SIZE) if (i, j) in self.special_tiles and 
-                            self.special_tiles[(i, j)]['type'] == 'frozen']
-            
-            # Reverse, compress, merge, then reverse back
-            column.reverse()
-            frozen_cells = [self.GRID_SIZE - 1 - idx for idx in frozen_cells]
-            new_column, merged, combo = self.compress_and_merge(column, frozen_cells)
-            new_column.reverse()
-            self.combo_count += combo
-            
-            if column[::-1] != new_column:
-                moved = True
-                # Update grid with new values
-                for i in range(self.GRID_SIZE):
-                    self.grid[i][j] = new_column[i]
-                    
-                # Apply special tile effects
-                if merged:
-                    self.apply_special_tile_effects()
-                    
-        return moved
-        
-    def move_left(self):
-        moved = False
-        for i in range(self.GRID_SIZE):
-            # Process each row
-            row = self.grid[i].copy()
-            frozen_cells = [j for j in range(self.GRID_SIZE) if (i, j) in self.special_tiles and 
-                            self.special_tiles[(i, j)]['type'] == 'frozen']
-            
-            new_row, merged, combo = self.compress_and_merge(row, frozen_cells)
-            self.combo_count += combo
-            
-            if row != new_row:
-                moved = True
-                # Update grid with new values
-                self.grid[i] = new_row
-                
-                # Apply special tile effects
-                if merged:
-                    self.apply_special_tile_effects()
-                    
-        return moved
-        
-    def move_right(self):
-        moved = False
-        for i in range(self.GRID_SIZE):
-            # Process each row right to left
-            row = self.grid[i].copy()
-            frozen_cells = [j for j in range(self.GRID_SIZE) if (i, j) in self.special_tiles and 
-                            self.special_tiles[(i, j)]['type'] == 'frozen']
-            
-            # Reverse, compress, merge, then reverse back
-            row.reverse()
-            frozen_cells = [self.GRID_SIZE - 1 - idx for idx in frozen_cells]
-            new_row, merged, combo = self.compress_and_merge(row, frozen_cells)
-            new_row.reverse()
-            self.combo_count += combo
-            
-            if row[::-1] != new_row:
-                moved = True
-                # Update grid with new values
-                self.grid[i] = new_row
-                
-                # Apply special tile effects
-                if merged:
-                    self.apply_special_tile_effects()
-                    
-        return moved
-        
-    def compress_and_merge(self, line, frozen_cells):
-        # Remove zeros and pack values together, skipping frozen cells
-        new_line = [0] * len(line)
-        idx = 0
-        
-        # First pass: compress
-        for i in range(len(line)):
-            if i in frozen_cells:
-                # Keep frozen cells in place
-                new_line[i] = line[i]
-            elif line[i] != 0:
-                # Find next non-frozen position
-                while idx in frozen_cells and idx < len(line):
-                    new_line[idx] = line[idx]  # Keep the frozen value
-                    idx += 1
-                
-                if idx < len(line):
-                    new_line[idx] = line[i]
-                    idx += 1
-        
-        # Second pass: merge
-        merged = False
-        combo_count = 0
-        for i in range(len(new_line) - 1):
-            if i in frozen_cells or i + 1 in frozen_cells:
-                continue
-                
-            if new_line[i] != 0 and new_line[i] == new_line[i + 1]:
-                # Merge tiles
-                new_line[i] *= 2
-                new_line[i + 1] = 0
-                self.score += new_line[i]
-                merged = True
-                combo_count += 1
-                
-                # Check for 2048 tile
-                if new_line[i] == 2048 and not self.game_won:
-                    self.game_won = True
-                    messagebox.showinfo("Congratulations", "You've reached 2048!")
-        
-        # Final pass: compress again after merging
-        final_line = [0] * len(line)
-        idx = 0
-        for i in range(len(new_line)):
-            if i in frozen_cells:
-                final_line[i] = new_line[i]
-            elif new_line[i] != 0:
-                # Find next non-frozen position
-                while idx in frozen_cells and idx < len(final_line):
-                    final_line[idx] = new_line[idx]  # Keep the frozen value
-                    idx += 1
-                
-                if idx < len(final_line):
-                    final_line[idx] = new_line[i]
-                    idx += 1
+        self.profiler = self.engine.profiler = MoveProfiler()
+        self.profile_status = "F4 saves JSON + CSV"
+        self.profile_overlay = tk.Label(self.master, font=("Courier", 9), justify=tk.LEFT, anchor="nw",
+                                        bg="#000000", fg="#7CFC00", padx=6, pady=4)
+        self.profile_overlay.place(x=5, y=5)
+        self.refresh_profile_overlay()
         
-        self.update_score_display()
-        return final_line, merged, combo_count
+    def refresh_profile_overlay(self):
+        self.profile_after_id = None
+        if self.profiler is None:
+            return
+        self.profile_overlay.config(text=f"{self.profiler.format_table()}\n{self.profile_status}")
+        self.profile_overlay.lift()
+        self.profile_after_id = self.master.after(500, self.refresh_profile_overlay)
         
-    def apply_special_tile_effects(self):
-        # Create a copy because we'll modify during iteration
-        special_tiles_copy = self.special_tiles.copy()
+    def dump_profile(self, event=None):
+        if self.profiler is None:
+            return
+        base = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            time.strftime("profile-%Y%m%d-%H%M%S"))
+        self.profiler.dump_json(base + ".json")
+        self.profiler.dump_csv(base + ".csv")
+        self.profile_status = f"saved {os.path.basename(base)}.json/.csv"
+        
+    def close(self):
+        self.drop_input()
+        self.cancel_hint()
+        if self.profile_after_id is not None:
+            self.master.after_cancel(self.profile_after_id)
+        self.hint_search.shutdown()
+        if self.recorder is not None:
+            self.recorder.close(self.engine)
+        if self.stats is not None:
+            if self.stats_job is not None:
+                self.master.after_cancel(self.stats_job)
+            self.stats.close()
+        self.master.destroy()
+        
+    def play_seed(self):
+        try:
+            seed = int(self.seed_var.get().strip())
+        except ValueError:
+            messagebox.showinfo("Seed", "The seed must be a whole number.")
+            return
+        self.new_game(seed)
         
-        for (i, j), special_info in special_tiles_copy.items():
-            tile_type = special_info['type']
-            
-            # Skip if the cell is now empty (was moved or merged)
-            if self.grid[i][j] == 0:
-                if (i, j) in self.special_tiles:
-                    del self.special_tiles[(i, j)]
-                continue
+    def key_press(self, event):
+        # The root binding also gets keys typed into the seed box; those aren't moves
+        if event.widget is self.seed_entry:
+            return
+        direction = KEY_DIRECTIONS.get(event.keysym)
+        if direction is None or self.engine.game_over:
+            return
+        # Held keys repeat faster than the board repaints; queue the move and
+        # play everything queued in one go once Tk has handled pending events
+        self.input_queue.append(direction)
+        if self.input_job is None:
+            self.input_job = self.master.after_idle(self.process_input)
+            
+    def process_input(self):
+        self.input_job = None
+        queue = self.input_queue
+        while queue:
+            direction = queue.popleft()
+            profiler = self.profiler
+            if profiler is not None:
+                profiler.begin()
                 
-            # Apply effects based on type
-            if tile_type == 'bomb':
-                # Bomb: clear surrounding tiles
-                for ni in range(max(0, i-1), min(self.GRID_SIZE, i+2)):
-                    for nj in range(max(0, j-1), min(self.GRID_SIZE, j+2)):
-                        if (ni, nj) != (i, j):  # Don't clear the bomb itself
-                            # Add score for cleared tiles
-                            if self.grid[ni][nj] > 0:
-                                self.score += self.grid[ni][nj] // 2
-                            self.grid[ni][nj] = 0
-                            if (ni, nj) in self.special_tiles:
-                                del self.special_tiles[(ni, nj)]
+            # A hint still being searched is for the old board
+            self.cancel_hint()
+            
+            # Where each tile slides, for the canvas renderer's animation. Only a
+            # frame with a single move is animated; more than one snaps.
+            paths = None
+            if self.board is not None and not self.frame_moves:
+                paths = self.engine.slide_paths(direction)
+            if profiler is not None:
+                profiler.mark("input")
                 
-                # Remove the bomb tile itself after use
-                if (i, j) in self.special_tiles:
-                    del self.special_tiles[(i, j)]
-                    
-            elif tile_type == 'swapper':
-                # Swapper: swap with a random adjacent non-zero tile
-                adjacent = []
-                for ni in range(max(0, i-1), min(self.GRID_SIZE, i+2)):
-                    for nj in range(max(0, j-1), min(self.GRID_SIZE, j+2)):
-                        if (ni, nj) != (i, j) and self.grid[ni][nj] > 0:
-                            adjacent.append((ni, nj))
+            # The engine saves undo state, moves, spawns, runs chaos and missions
+            result = self.engine.step(direction)
+            if profiler is not None:
+                profiler.end()
                 
-                if adjacent:
-                    ni, nj = random.choice(adjacent)
-                    # Swap values
-                    self.grid[i][j], self.grid[ni][nj] = self.grid[ni][nj], self.grid[i][j]
-                    
-                    # Move special tile status
-                    if (ni, nj) in self.special_tiles:
-                        self.special_tiles[(i, j)] = self.special_tiles[(ni, nj)]
-                        del self.special_tiles[(ni, nj)]
-                    else:
-                        # Remove swapper status after use
-                        if (i, j) in self.special_tiles:
-                            del self.special_tiles[(i, j)]
+            if result.moved:
+                self.frame_moves += 1
+                self.frame_paths = paths if self.frame_moves == 1 else None
+            if result.game_over:
+                queue.clear()
+                
+        if self.frame_moves:
+            self.schedule_render()
             
-            # Frozen tiles don't have an active effect, they just restrict movement
-        
-        self.update_score_display()
+    def queue_event(self, event):
+        # EventBus handler; it runs in the middle of a move, so just keep the event for the next frame
+        self.frame_events.append(event)
+        self.schedule_render()
+            
+    def schedule_render(self):
+        if self.render_job is not None:
+            return
+        wait = FRAME_MS - (time.perf_counter() - self.last_render) * 1000
+        if wait >= 1:
+            self.render_job = self.master.after(int(wait), self.render_frame)
+        else:
+            self.render_job = self.master.after_idle(self.render_frame)
+            
+    def render_frame(self):
+        # One repaint for every move played since the last frame, then one toast for their events
+        self.render_job = None
+        self.last_render = time.perf_counter()
+        profiler = self.profiler
         
-    def update_special_tiles(self):
-        # Update turn counters for time-limited special tiles
-        to_remove = []
-        
-        for pos, info in self.special_tiles.items():
-            if info['turns'] > 0:
-                info['turns'] -= 1
-                if info['turns'] <= 0:
-                    to_remove.append(pos)
-                    
-        # Remove expired special tiles
-        for pos in to_remove:
-            if pos in self.special_tiles:
-                del self.special_tiles[pos]
+        if self.frame_moves:
+            start = time.perf_counter_ns()
+            self.update_score_display()
+            self.undo_btn.config(text=f"Undo ({self.engine.undo_count})")
+            self.update_mission_display()
+            self.update_grid_display(self.frame_paths)
+            if profiler is not None:
+                # Tk repaints when idle; do it now so the repaint is timed too
+                self.master.update_idletasks()
+                profiler.add("render", time.perf_counter_ns() - start)
+        self.frame_moves = 0
+        self.frame_paths = None
+        
+        events, self.frame_events = self.frame_events, []
+        if events:
+            start = time.perf_counter_ns()
+            self.show_toast(events)
+            if profiler is not None:
+                profiler.add("toasts", time.perf_counter_ns() - start)
                 
-    def check_game_over(self):
-        # Check if there are any empty cells
-        for i in range(self.GRID_SIZE):
-            for j in range(self.GRID_SIZE):
-                if self.grid[i][j] == 0:
-                    return False
-        
-        # Check if there are any adjacent cells with the same value
-        for i in range(self.GRID_SIZE):
-            for j in range(self.GRID_SIZE):
-                # Skip if cell is frozen
-                if (i, j) in self.special_tiles and self.special_tiles[(i, j)]['type'] == 'frozen':
-                    continue
-                    
-                # Check adjacent cells
-                value = self.grid[i][j]
-                if (i > 0 and self.grid[i-1][j] == value) or \
-                   (i < self.GRID_SIZE-1 and self.grid[i+1][j] == value) or \
-                   (j > 0 and self.grid[i][j-1] == value) or \
-                   (j < self.GRID_SIZE-1 and self.grid[i][j+1] == value):
-                    return False
-                    
-        # If we get here, no moves are possible
-        return True
-        
-    def save_state(self):
-        if len(self.previous_states) >= 5:  # Keep the last 5 states max
-            self.previous_states.pop(0)
+    def flush_input(self):
+        # Play and draw queued moves now, for actions that must come after them
+        if self.input_job is not None:
+            self.master.after_cancel(self.input_job)
+            self.process_input()
+        if self.render_job is not None:
+            self.master.after_cancel(self.render_job)
+            self.render_frame()
+            
+    def drop_input(self):
+        # Forget queued moves and the pending repaint (new game, closing)
+        self.input_queue.clear()
+        for job in (self.input_job, self.render_job):
+            if job is not None:
+                self.master.after_cancel(job)
+        self.input_job = self.render_job = None
+        self.frame_moves = 0
+        self.frame_paths = None
+        self.frame_events = []
+        
+    def show_toast(self, events):
+        # One label for a frame's events, stacked over the bottom of the board; nothing waits on it
+        # (repeats, e.g. several chaos events in one frame, are shown once)
+        toast = tk.Label(self.master, text="\n".join(dict.fromkeys(event.text for event in events)),
+                         font=("Arial", 12, "bold"), bg="#8f7a66", fg="#ffffff", padx=12, pady=6)
+        self.toasts.append(toast)
+        while len(self.toasts) > MAX_TOASTS:
+            self.dismiss_toast(self.toasts[0])
+        if not any(isinstance(event, STICKY_EVENTS) for event in events):
+            self.master.after(TOAST_MS, lambda: self.dismiss_toast(toast))
+        self.place_toasts()
+        
+    def place_toasts(self):
+        # Newest at the bottom, older ones above it
+        y = -10
+        for toast in reversed(self.toasts):
+            toast.place(relx=0.5, rely=1.0, y=y, anchor="s")
+            toast.lift()
+            y -= toast.winfo_reqheight() + 6
+            
+    def dismiss_toast(self, toast):
+        if toast in self.toasts:
+            self.toasts.remove(toast)
+            toast.destroy()
+            self.place_toasts()
+            
+    def clear_toasts(self):
+        for toast in self.toasts:
+            toast.destroy()
+        self.toasts = []
             
-        # Save current state
-        state = {
-            'grid': copy.deepcopy(self.grid),
-            'score': self.score,
-            'special_tiles': copy.deepcopy(self.special_tiles),
-            'mission': copy.deepcopy(self.current_mission)
-        }
-        self.previous_states.append(state)
-        
     def undo_move(self):
-        if not self.previous_states or self.undo_count <= 0:
+        self.flush_input()
+        if not self.engine.undo_move():
             return
+        self.cancel_hint()
             
-        # Restore previous state
-        state = self.previous_states.pop()
-        self.grid = state['grid']
-        self.score = state['score']
-        self.special_tiles = state['special_tiles']
-        self.current_mission = state['mission']
-        
-        # Decrement undo count
-        self.undo_count -= 1
-        self.undo_btn.config(text=f"Undo ({self.undo_count})")
+        self.undo_btn.config(text=f"Undo ({self.engine.undo_count})")
         
         # Update display
         self.update_score_display()
         self.update_mission_display()
         self.update_grid_display()
         
-    def get_hint(self):
-        if self.game_over:
+    def redo_move(self):
+        self.flush_input()
+        if not self.engine.redo_move():
             return
-            
-        # Try each direction and see which gives the best score improvement
-        best_direction = None
-        best_score_gain = -1
-        
-        # Save current state
-        original_grid = copy.deepcopy(self.grid)
-        original_score = self.score
-        original_special_tiles = copy.deepcopy(self.special_tiles)
-        
-        directions = ["Up", "Down", "Left", "Right"]
-        for direction in directions:
-            # Reset to original state
-            self.grid = copy.deepcopy(original_grid)
-            self.score = original_score
-            self.special_tiles = copy.deepcopy(original_special_tiles)
-            
-            # Try move
-            moved = False
-            if direction == "Up":
-                moved = self.move_up()
-            elif direction == "Down":
-                moved = self.move_down()
-            elif direction == "Left":
-                moved = self.move_left()
-            elif direction == "Right":
-                moved = self.move_right()
-            
-            if moved:
-                score_gain = self.score - original_score
-                if score_gain > best_score_gain:
-                    best_score_gain = score_gain
-                    best_direction = direction
-        
-        # Restore original state
-        self.grid = original_grid
-        self.score = original_score
-        self.special_tiles = original_special_tiles
-        
-        # Show hint
-        if best_direction:
-            messagebox.showinfo("Hint", f"Try moving {best_direction} for best results!")
-        else:
-            messagebox.showinfo("Hint", "No good moves available!")
-            
-    def trigger_chaos_event(self):
-        # Pick a random chaos event
-        event_type = random.choice([
-            "shuffle_one_row",
-            "shuffle_one_column",
-            "add_extra_tile",
-            "add_special_tile"
-        ])
-        
-        if event_type == "shuffle_one_row":
-            # Shuffle a random row
-            row = random.randint(0, self.GRID_SIZE-1)
-            values = [self.grid[row][j] for j in range(self.GRID_SIZE) if self.grid[row][j] != 0]
-            random.shuffle(values)
-            
-            # Place shuffled values back
-            idx = 0
-            for j in range(self.GRID_SIZE):
-                if self.grid[row][j] != 0:
-                    self.grid[row][j] = values[idx]
-                    idx += 1
-            
-        elif event_type == "shuffle_one_column":
-            # Shuffle a random column
-            col = random.randint(0, self.GRID_SIZE-1)
-            values = [self.grid[i][col] for i in range(self.GRID_SIZE) if self.grid[i][col] != 0]
-            random.shuffle(values)
-            
-            # Place shuffled values back
-            idx = 0
-            for i in range(self.GRID_SIZE):
-                if self.grid[i][col] != 0:
-                    self.grid[i][col] = values[idx]
-                    idx += 1
-                    
-        elif event_type == "add_extra_tile":
-            # Add an extra tile
-            self.add_new_tile()
-            
-        elif event_type == "add_special_tile":
-            # Find empty spot and add a special tile
-            empty_cells = [(i, j) for i in range(self.GRID_SIZE) for j in range(self.GRID_SIZE) if self.grid[i][j] == 0]
-            if empty_cells:
-                i, j = random.choice(empty_cells)
-                self.grid[i][j] = 2
-                special_type = random.choice(self.special_types)
-                self.special_tiles[(i, j)] = {
-                    'type': special_type,
-                    'turns': 3 if special_type == 'frozen' else -1
-                }
+        self.cancel_hint()
         
-        # Show chaos mode notification
-        messagebox.showinfo("Chaos Mode", "Chaos event triggered! The board has been altered.")
-        
-    def check_missions(self):
-        # Check mission progress based on type
-        if self.current_mission["type"] == "merge":
-            # Check if any tile with the target value exists
-            for i in range(self.GRID_SIZE):
-                for j in range(self.GRID_SIZE):
-                    if self.grid[i][j] >= self.current_mission["goal_value"]:
-                        self.complete_mission()
-                        return
-                        
-        elif self.current_mission["type"] == "combo":
-            # Check if we made enough merges in one move
-            if self.combo_count >= self.current_mission["goal_value"]:
-                self.complete_mission()
-                return
-                
-        elif self.current_mission["type"] == "score":
-            # Check if score meets target
-            if self.score >= self.current_mission["goal_value"]:
-                self.complete_mission()
-                return
-                
-    def complete_mission(self):
-        if self.current_mission["completed"]:
+        self.undo_btn.config(text=f"Undo ({self.engine.undo_count})")
+        self.update_score_display()
+        self.update_mission_display()
+        self.update_grid_display()
+        
+    def get_hint(self):
+        self.flush_input()
+        if self.engine.game_over:
             return
             
-        # Mark mission as completed
-        self.current_mission["completed"] = True
-        
-        # Reward based on mission
-        if self.current_mission["type"] == "merge":
-            # Reward: Extra undo
-            self.undo_count = min(self.undo_count + 1, 5)
-            self.undo_btn.config(text=f"Undo ({self.undo_count})")
-            reward_text = "Reward: +1 Undo!"
+        # Search on copies of the engine in the background, the live game is untouched
+        self.cancel_hint()
+        self.hint_job = self.hint_search.start(self.engine)
+        self.hint_label.config(text="Hint: thinking...")
+        self.master.after(10, self.poll_hint)
+        
+    def cancel_hint(self):
+        if self.hint_job is not None:
+            self.hint_job.cancel()
+            self.hint_job = None
+        self.hint_label.config(text="")
+            
+    def poll_hint(self):
+        job = self.hint_job
+        if job is None or job.cancelled:
+            return
+        if job.moves != self.engine.moves:
+            # The board changed since the search started
+            self.cancel_hint()
+            return
             
-        elif self.current_mission["type"] == "combo":
-            # Reward: Bomb tile
-            empty_cells = [(i, j) for i in range(self.GRID_SIZE) for j in range(self.GRID_SIZE) if self.grid[i][j] == 0]
-            if empty_cells:
-                i, j = random.choice(empty_cells)
-                self.grid[i][j] = 2
-                self.special_tiles[(i, j)] = {'type': 'bomb', 'turns': -1}
-            reward_text = "Reward: Bomb tile added!"
+        done = job.done()
+        hint = job.poll()
+        if hint is not None:
+            if hint.direction:
+                text = f"Hint: {hint.direction}"
+            else:
+                text = "Hint: No good moves available!"
+            if not done:
+                text += f" (depth {hint.depth}...)"
+            self.hint_label.config(text=text)
             
-        elif self.current_mission["type"] == "score":
-            # Reward: Extra points
-            bonus = self.current_mission["goal_value"] // 5
-            self.score += bonus
-            self.update_score_display()
-            reward_text = f"Reward: +{bonus} points!"
+        if done:
+            self.hint_job = None
+        else:
+            self.master.after(50, self.poll_hint)
             
-        # Show completion message
-        messagebox.showinfo("Mission Complete", f"Mission completed: {self.current_mission['description']}!\n{reward_text}")
-        
-        # Set new mission
-        available_missions = [m for m in self.missions if m != self.current_mission]
-        self.current_mission = random.choice(available_missions)
-        self.current_mission["completed"] = False
-        self.update_mission_display()
-        
     def update_mission_display(self):
-        mission_text = f"{self.current_mission['description']} - "
-        if self.current_mission["type"] == "merge":
-            mission_text += f"Progress: Highest tile = {self.get_highest_tile()}/{self.current_mission['goal_value']}"
-        elif self.current_mission["type"] == "combo":
-            mission_text += f"Progress: {self.combo_count}/{self.current_mission['goal_value']} merges in one move"
-        elif self.current_mission["type"] == "score":
-            mission_text += f"Progress: {self.score}/{self.current_mission['goal_value']} points"
-            
-        self.mission_label.config(text=mission_text)
-        
-    def get_highest_tile(self):
-        return max(max(row) for row in self.grid)
+        # One line per active mission, worded by its kind
+        lines = []
+        for slot, index in enumerate(self.engine.active_missions):
+            mission = self.engine.missions[index]
+            progress = MISSION_KINDS[mission["type"]]["progress"].format(
+                value=self.engine.mission_progress(slot), goal=mission["goal_value"])
+            lines.append(f"{mission['description']} - Progress: {progress}")
+            
+        self.mission_label.config(text="\n".join(lines))
+        
+    def poll_stats(self):
+        self.stats_job = None
+        if self.stats.ready.is_set():
+            self.load_high_score()
+        else:
+            self.stats_job = self.master.after(50, self.poll_stats)
+            
+    def load_high_score(self):
+        # With stats, the high score is the best for the game's mode (classic,
+        # chaos or timed) and board size, across sessions
+        if self.stats is not None:
+            self.engine.high_score = max(self.engine.score,
+                                         self.stats.high_score(self.stats.game_mode(), self.GRID_SIZE))
+        self.update_score_display()
         
     def update_score_display(self):
-        self.score_label.config(text=str(self.score))
-        if self.score > self.high_score:
-            self.high_score = self.score
-            self.highscore_label.config(text=str(self.high_score))
+        self.score_label.config(text=str(self.engine.score))
+        self.highscore_label.config(text=str(self.engine.high_score))
             
     def update_timer(self):
-        if not self.timed_mode or not self.timer_running:
+        if not self.engine.timed_mode or not self.timer_running:
             return
             
-        if self.time_left > 0:
-            self.time_left -= 1
-            self.time_label.config(text=str(self.time_left))
+        if not self.engine.tick_timer():
+            self.time_label.config(text=str(self.engine.time_left))
             self.master.after(1000, self.update_timer)
         else:
+            # The engine announces TimeUp through the event bus
             self.timer_running = False
-            self.game_over = True
-            messagebox.showinfo("Time's Up", f"Time's up! Your score: {self.score}")
             
     def toggle_chaos(self):
-        self.chaos_mode = self.chaos_var.get()
+        self.engine.chaos_mode = self.chaos_var.get()
+        self.note_mode()
         
     def toggle_timed(self):
-        self.timed_mode = self.timed_var.get()
-        if self.timed_mode and not self.timer_running:
+        self.engine.timed_mode = self.timed_var.get()
+        self.note_mode()
+        if self.engine.timed_mode and not self.timer_running:
             self.timer_running = True
             self.update_timer()
-        elif not self.timed_mode:
+        elif not self.engine.timed_mode:
             self.timer_running = False
+            
+    def note_mode(self):
+        # Switching chaos or timed mode on moves the game to that mode's high scores
+        if self.stats is not None:
+            self.stats.note_mode(self.engine)
+            self.load_high_score()
+            
     def _apply_theme_recursive(self, widget, theme, panel_bg, score_bg, text_fg):
         """ Recursively apply colors to widgets, but skip theme swatches. """
         # 1) Skip over the swatch buttons entirely
@@ -978,12 +839,33 @@ class Game2048:
         # recursively restyle every widget
         self._apply_theme_recursive(self.master, theme, panel_bg, score_bg, text_fg)
 
-        # finally redraw the tiles with the new tile‐color map
+        # finally redraw the tiles with the new tile‐color map; the restyle
+        # above touched the cells too, so all of them need repainting
+        self.invalidate_grid_display()
         self.update_grid_display()
 
         
 
 if __name__ == "__main__":
+    if sys.argv[1:2] == ["tournament"]:
+        # Headless self-play, no window: python Enhanced-2048.py tournament --help
+        from tournament import main
+        sys.exit(main(sys.argv[2:]))
+
     root = tk.Tk()
-    app = Game2048(root)
+    # python Enhanced-2048.py --canvas draws the board on one animated Canvas
+    # --profile starts with the move timing overlay on (F3 toggles it)
+    # --size N plays on an N x N board
+    # --input-depth N keeps up to N moves queued while the board catches up
+    # --no-stats keeps no high scores or game stats (stats.db)
+    grid_size = 4
+    if "--size" in sys.argv[1:-1]:
+        grid_size = int(sys.argv[sys.argv.index("--size") + 1])
+    input_depth = INPUT_QUEUE_DEPTH
+    if "--input-depth" in sys.argv[1:-1]:
+        input_depth = int(sys.argv[sys.argv.index("--input-depth") + 1])
+    app = Game2048(root, renderer="canvas" if "--canvas" in sys.argv[1:] else "labels",
+                   replay_path=None if "--no-replay" in sys.argv[1:] else REPLAY_PATH,
+                   profile="--profile" in sys.argv[1:], grid_size=grid_size, input_depth=input_depth,
+                   stats_path=None if "--no-stats" in sys.argv[1:] else STATS_PATH)
     root.mainloop()
\ No newline at end of file
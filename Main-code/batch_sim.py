@@ -0,0 +1,293 @@
+""" Vectorized Monte Carlo simulator for tuning game parameters.
+
+BatchEngine advances N games at once. Boards are a NumPy (N, size, size)
+uint8 array of log2 tile values (0 is empty), and frozen tiles are a
+parallel array of turns left. Every move, spawn and game-over check is a
+handful of array operations over all games, so there are no per-game
+Python loops in the inner step.
+
+The rules follow GameEngine: moves slide and merge around frozen cells the
+same way merge_line does, spawns use the 90/10 odds from add_new_tile with
+special_chance of the tile being special, frozen tiles last three turns and
+chaos events fire every chaos_frequency moves. Bomb and swapper effects and
+mission rewards are not modelled; those specials spawn as plain tiles.
+
+Requires NumPy, which the game itself does not need.
+"""
+
+import numpy as np
+
+# Direction codes used by step(), in game_engine.DIRECTIONS order
+UP, DOWN, LEFT, RIGHT = range(4)
+
+
+def _line_orders(size):
+    # For each direction, the flat cell index of every line position when
+    # the move is seen as sliding lines towards position 0
+    orders = np.zeros((4, size * size), dtype=np.intp)
+    for r in range(size):
+        for k in range(size):
+            orders[UP, r * size + k] = k * size + r
+            orders[DOWN, r * size + k] = (size - 1 - k) * size + r
+            orders[LEFT, r * size + k] = r * size + k
+            orders[RIGHT, r * size + k] = r * size + (size - 1 - k)
+    return orders
+
+
+def compress(lines, frozen):
+    """ Pack the non-frozen tiles of each line into the non-frozen slots, in order.
+
+    lines and frozen are (L, n) arrays; frozen cells keep their value.
+    """
+    count, n = lines.shape
+    free = ~frozen
+
+    # next_slot[:, p] is the first non-frozen position at or after p (n if none)
+    next_slot = np.full((count, n + 1), n, dtype=np.intp)
+    for p in range(n - 1, -1, -1):
+        next_slot[:, p] = np.where(free[:, p], p, next_slot[:, p + 1])
+
+    out = np.where(frozen, lines, 0)
+    target = next_slot[:, 0].copy()
+    rows = np.arange(count)
+    for i in range(n):
+        take = free[:, i] & (lines[:, i] != 0)
+        out[rows[take], target[take]] = lines[take, i]
+        target[take] = next_slot[rows[take], target[take] + 1]
+    return out
+
+
+def merge_lines(lines, frozen):
+    """ Vectorized merge_line on log2 lines.
+
+    Returns (new_lines, score_gained, merge_count) with one score and count per line.
+    """
+    work = compress(lines, frozen)
+    score = np.zeros(len(lines), dtype=np.int64)
+    merges = np.zeros(len(lines), dtype=np.int64)
+    for i in range(lines.shape[1] - 1):
+        pair = (~frozen[:, i] & ~frozen[:, i + 1] &
+                (work[:, i] != 0) & (work[:, i] == work[:, i + 1]))
+        work[pair, i] += 1
+        work[pair, i + 1] = 0
+        score += np.where(pair, np.left_shift(1, work[:, i].astype(np.int64)), 0)
+        merges += pair
+    return compress(work, frozen), score, merges
+
+
+class BatchEngine:
+    def __init__(self, games, grid_size=4, seed=None, special_chance=0.08,
+                 special_types=('bomb', 'swapper', 'frozen'), chaos_mode=False, chaos_frequency=10):
+        self.games = games
+        self.GRID_SIZE = grid_size
+        self.special_chance = special_chance
+        self.special_types = list(special_types)
+        self.chaos_mode = chaos_mode
+        self.chaos_frequency = chaos_frequency
+        self.rng = np.random.default_rng(seed)
+        self._orders = _line_orders(grid_size)
+        self.reset()
+
+    def reset(self):
+        n, size = self.games, self.GRID_SIZE
+        self.board = np.zeros((n, size, size), dtype=np.uint8)
+        self.frozen = np.zeros((n, size, size), dtype=np.uint8)  # turns left, 0 = not frozen
+        self.score = np.zeros(n, dtype=np.int64)
+        self.moves = np.zeros(n, dtype=np.int64)
+        self.max_combo = np.zeros(n, dtype=np.int64)
+        self.game_over = np.zeros(n, dtype=bool)
+        everyone = np.arange(n)
+        self.add_new_tile(everyone)
+        self.add_new_tile(everyone)
+
+    def slide(self, board, frozen, directions):
+        # Move every board in its own direction; returns (new_board, score, merges)
+        n, size = len(board), self.GRID_SIZE
+        cells = size * size
+        order = self._orders[directions]
+        rows = np.arange(n)[:, None]
+        lines = board.reshape(n, cells)[rows, order].reshape(n * size, size)
+        locked = (frozen.reshape(n, cells)[rows, order] > 0).reshape(n * size, size)
+
+        merged, score, merges = merge_lines(lines, locked)
+
+        new_board = np.empty((n, cells), dtype=board.dtype)
+        new_board[rows, order] = merged.reshape(n, cells)
+        return (new_board.reshape(board.shape), score.reshape(n, size).sum(axis=1),
+                merges.reshape(n, size).sum(axis=1))
+
+    def legal_moves(self, games=None):
+        # (len(games), 4) mask of directions that would change each board
+        games = np.nonzero(~self.game_over)[0] if games is None else games
+        board, frozen = self.board[games], self.frozen[games]
+        legal = np.zeros((len(games), 4), dtype=bool)
+        for code in range(4):
+            moved, _, _ = self.slide(board, frozen, np.full(len(games), code))
+            legal[:, code] = (moved != board).any(axis=(1, 2))
+        return legal
+
+    def step(self, directions, games=None):
+        """ Play one move in each of the given games (all running games by default).
+
+        directions is one code per game, or a (games, k) array of preferences
+        where each game plays the first direction that changes its board.
+        Returns the indices of the games that moved.
+        """
+        games = np.nonzero(~self.game_over)[0] if games is None else np.asarray(games)
+        directions = np.asarray(directions)
+        if directions.ndim == 1:
+            directions = directions[:, None]
+
+        moved_games = []
+        moved_merges = []
+        pending = np.arange(len(games))
+        for attempt in range(directions.shape[1]):
+            if not len(pending):
+                break
+            idx = games[pending]
+            board = self.board[idx]
+            new_board, gained, merges = self.slide(board, self.frozen[idx], directions[pending, attempt])
+            moved = (new_board != board).any(axis=(1, 2))
+
+            idx = idx[moved]
+            self.board[idx] = new_board[moved]
+            self.score[idx] += gained[moved]
+            moved_games.append(idx)
+            moved_merges.append(merges[moved])
+            pending = pending[~moved]
+
+        moved = np.concatenate(moved_games) if moved_games else np.zeros(0, dtype=np.intp)
+        merges = np.concatenate(moved_merges) if moved_merges else np.zeros(0, dtype=np.int64)
+        self.max_combo[moved] = np.maximum(self.max_combo[moved], merges)
+        self.moves[moved] += 1
+
+        # A merge clears special tiles left on empty cells, like apply_special_tile_effects
+        merged = moved[merges > 0]
+        self.frozen[merged] = np.where(self.board[merged] == 0, 0, self.frozen[merged])
+
+        self.add_new_tile(moved)
+
+        # Frozen tiles count down after the spawn, like update_special_tiles
+        frozen = self.frozen[moved]
+        self.frozen[moved] = np.where(frozen > 0, frozen - 1, 0)
+
+        if self.chaos_mode:
+            chaos = moved[self.moves[moved] % self.chaos_frequency == 0]
+            if len(chaos):
+                self.trigger_chaos_event(chaos)
+
+        self.game_over[moved] = self.check_game_over(moved)
+        return moved
+
+    def add_new_tile(self, games, value=None):
+        # Spawn one tile in a uniformly random empty cell of each game that has one
+        if not len(games):
+            return games
+        cells_per_game = self.GRID_SIZE * self.GRID_SIZE
+        flat = self.board.reshape(self.games, -1)
+        keys = self.rng.random((len(games), cells_per_game))
+        keys[flat[games] != 0] = -1.0
+        cells = keys.argmax(axis=1)
+        has_empty = keys[np.arange(len(games)), cells] >= 0
+        games, cells = games[has_empty], cells[has_empty]
+
+        if value is None:
+            values = np.where(self.rng.random(len(games)) < 0.9, 1, 2)
+            special = self.rng.random(len(games)) < self.special_chance
+        else:
+            values = np.full(len(games), value)
+            special = np.ones(len(games), dtype=bool)
+        flat[games, cells] = values
+
+        # Only frozen specials change how the board moves
+        if 'frozen' in self.special_types:
+            kinds = self.rng.integers(0, len(self.special_types), len(games))
+            frozen = special & (kinds == self.special_types.index('frozen'))
+            self.frozen.reshape(self.games, -1)[games[frozen], cells[frozen]] = 3
+        return games
+
+    def _shuffle_lines(self, lines):
+        # Shuffle the non-empty tiles within one row (or column) per game
+        count, size = lines.shape
+        nonzero = lines != 0
+        keys = np.where(nonzero, self.rng.random((count, size)), 2.0)
+        shuffled = np.take_along_axis(lines, np.argsort(keys, axis=1), axis=1)
+        slots = np.argsort(~nonzero, axis=1, kind='stable')
+        out = lines.copy()
+        rank = np.arange(size)[None, :] < nonzero.sum(axis=1, keepdims=True)
+        rows = np.nonzero(rank)[0]
+        out[rows, slots[rank]] = shuffled[rank]
+        return out
+
+    def trigger_chaos_event(self, games):
+        events = self.rng.integers(0, 4, len(games))
+        size = self.GRID_SIZE
+
+        rows = games[events == 0]
+        if len(rows):
+            r = self.rng.integers(0, size, len(rows))
+            self.board[rows, r, :] = self._shuffle_lines(self.board[rows, r, :])
+
+        cols = games[events == 1]
+        if len(cols):
+            c = self.rng.integers(0, size, len(cols))
+            self.board[cols, :, c] = self._shuffle_lines(self.board[cols, :, c])
+
+        self.add_new_tile(games[events == 2])
+        self.add_new_tile(games[events == 3], value=1)
+
+    def check_game_over(self, games=None):
+        # Same test as GameEngine.check_game_over, for many games at once
+        games = np.arange(self.games) if games is None else games
+        board = self.board[games]
+        locked = self.frozen[games] > 0
+        full = (board != 0).all(axis=(1, 2))
+        horizontal = (board[:, :, :-1] == board[:, :, 1:]) & ~(locked[:, :, :-1] & locked[:, :, 1:])
+        vertical = (board[:, :-1, :] == board[:, 1:, :]) & ~(locked[:, :-1, :] & locked[:, 1:, :])
+        can_merge = horizontal.any(axis=(1, 2)) | vertical.any(axis=(1, 2))
+        return full & ~can_merge
+
+    def max_tile(self):
+        exponents = self.board.reshape(self.games, -1).max(axis=1).astype(np.int64)
+        return np.where(exponents > 0, np.left_shift(1, exponents), 0)
+
+    def run(self, max_moves=10000):
+        """ Play every game with uniformly random moves until it ends.
+
+        Each game tries the four directions in a random order and plays the
+        first one that changes the board; a game where none does (e.g.
+        frozen tiles block every line) ends too. Returns per-game score,
+        moves, max_tile and max_combo arrays.
+        """
+        for _ in range(max_moves):
+            games = np.nonzero(~self.game_over)[0]
+            if not len(games):
+                break
+            preferences = np.argsort(self.rng.random((len(games), 4)), axis=1)
+            moved = self.step(preferences, games)
+            stuck = np.setdiff1d(games, moved, assume_unique=True)
+            self.game_over[stuck] = True
+
+        return {
+            "score": self.score.copy(),
+            "moves": self.moves.copy(),
+            "max_tile": self.max_tile(),
+            "max_combo": self.max_combo.copy(),
+        }
+
+
+def simulate(games, seed=None, max_moves=10000, **options):
+    # Convenience wrapper: play `games` random games and return the result arrays
+    return BatchEngine(games, seed=seed, **options).run(max_moves)
+
+
+if __name__ == "__main__":
+    import time
+
+    start = time.perf_counter()
+    results = simulate(10000, seed=0)
+    elapsed = time.perf_counter() - start
+    print(f"{len(results['score'])} games in {elapsed:.2f}s, "
+          f"mean score {results['score'].mean():.0f}, "
+          f"mean moves {results['moves'].mean():.0f}, "
+          f"best tile {results['max_tile'].max()}")
@@ -0,0 +1,386 @@
+""" Micro-benchmarks for the engine's hot paths.
+
+Each benchmark times one engine call at a time on every board of a fixed,
+seeded corpus, restoring the board before each call so every sample starts
+from the same position:
+
+    sparse        a handful of small tiles, lots of empty cells
+    dense         12-16 tiles up to 1024, full boards included
+    frozen-heavy  about a third of the tiles frozen
+    bomb-heavy    about a third of the tiles bombs or swappers
+
+Same seed, same boards, so runs on different commits or machines measure
+the same work. Results are per (benchmark, corpus): ops/sec of the best
+of --repeat rounds, plus per-call percentiles in microseconds over all of
+them, with the cost of reading the clock subtracted.
+
+    python benchmark.py --output baseline.json
+    python benchmark.py --compare baseline.json      # after a change
+    python benchmark.py --only move_left check_game_over --corpora dense
+    python benchmark.py --size 16 --only step     # same corpora on a 16x16 board
+"""
+
+import gc
+import sys
+import json
+import time
+import platform
+import argparse
+from collections import namedtuple
+
+from game_engine import GameEngine, DIRECTIONS
+from hint_engine import HintEngine
+from rng import GameRandom
+
+CORPORA = ["sparse", "dense", "frozen-heavy", "bomb-heavy"]
+PERCENTILES = (50, 90, 99)
+OUTLIER_FACTOR = 10
+
+# A corpus position: the engine snapshot to restore, and its rows and columns
+# as (line, frozen mask) pairs for compress_and_merge
+Board = namedtuple("Board", ["snapshot", "lines"])
+
+
+def random_board(rng, corpus, size):
+    """ (grid, special_tiles) for one board of the given corpus. """
+    cells = [(i, j) for i in range(size) for j in range(size)]
+    rng.shuffle(cells)
+    area = size * size
+    if corpus == "sparse":
+        count, top = rng.randint(2, max(2, area // 4)), 3
+    elif corpus == "dense":
+        count, top = rng.randint(area - area // 4, area), 10
+    else:
+        count, top = rng.randint(area // 2, area - 1), 8
+
+    grid = [[0] * size for _ in range(size)]
+    special_tiles = {}
+    for i, j in cells[:count]:
+        # Small tiles are the common ones, as in real play
+        grid[i][j] = 2 ** min(rng.randint(1, top), rng.randint(1, top))
+        if rng.random() < 1 / 3:
+            if corpus == "frozen-heavy":
+                special_tiles[(i, j)] = {'type': 'frozen', 'turns': rng.randint(1, 3)}
+            elif corpus == "bomb-heavy":
+                special_tiles[(i, j)] = {'type': rng.choice(['bomb', 'bomb', 'swapper']), 'turns': -1}
+    return grid, special_tiles
+
+
+def make_corpus(corpus, boards, seed=0, size=4):
+    """ Boards of one corpus; the same arguments always give the same boards. """
+    rng = GameRandom(seed).split(CORPORA.index(corpus))
+    engine = GameEngine(size, seed=seed)
+    result = []
+    for _ in range(boards):
+        engine.grid, engine.special_tiles = random_board(rng, corpus, size)
+        engine.recount()
+        # Every board also carries its own RNG state, so spawns differ between boards
+        engine.rng = rng.split(len(result))
+        lines = []
+        for k in range(size):
+            for cells in ([(k, j) for j in range(size)], [(i, k) for i in range(size)]):
+                lines.append(([engine.grid[i][j] for i, j in cells],
+                              sum(1 << n for n, pos in enumerate(cells) if engine.is_frozen(pos))))
+        result.append(Board(engine.snapshot(), lines))
+    return result
+
+
+def _clock_overhead():
+    # Smallest gap between two clock reads, taken off every sample
+    clock = time.perf_counter_ns
+    best = None
+    for _ in range(10000):
+        start = clock()
+        gap = clock() - start
+        if best is None or gap < best:
+            best = gap
+    return best
+
+
+def _time_call(engine, board, call):
+    # Restore the board, then time one call on it
+    engine.restore(board.snapshot)
+    engine.history = engine.future = None
+    engine.undo_count = engine.undo_limit
+    engine.game_over = False
+    clock = time.perf_counter_ns
+    start = clock()
+    call(engine)
+    return [clock() - start]
+
+
+def bench_compress_and_merge(engine, board):
+    samples = []
+    clock = time.perf_counter_ns
+    compress_and_merge = engine.compress_and_merge
+    for line, frozen_mask in board.lines:
+        start = clock()
+        compress_and_merge(line, frozen_mask)
+        samples.append(clock() - start)
+    return samples
+
+
+def bench_move_up(engine, board):
+    return _time_call(engine, board, GameEngine.move_up)
+
+
+def bench_move_down(engine, board):
+    return _time_call(engine, board, GameEngine.move_down)
+
+
+def bench_move_left(engine, board):
+    return _time_call(engine, board, GameEngine.move_left)
+
+
+def bench_move_right(engine, board):
+    return _time_call(engine, board, GameEngine.move_right)
+
+
+def bench_add_new_tile(engine, board):
+    return _time_call(engine, board, GameEngine.add_new_tile)
+
+
+def bench_apply_special_tile_effects(engine, board):
+    return _time_call(engine, board, GameEngine.apply_special_tile_effects)
+
+
+def bench_check_game_over(engine, board):
+    return _time_call(engine, board, GameEngine.check_game_over)
+
+
+def bench_save_state(engine, board):
+    return _time_call(engine, board, GameEngine.save_state)
+
+
+def bench_step(engine, board):
+    # A whole turn: undo snapshot, move, spawn, special tiles, missions, game-over check
+    samples = []
+    for direction in DIRECTIONS:
+        samples.extend(_time_call(engine, board, lambda engine: engine.step(direction)))
+    return samples
+
+
+def bench_undo_move(engine, board):
+    engine.restore(board.snapshot)
+    engine.history = engine.future = None
+    engine.undo_count = engine.undo_limit
+    engine.save_state()
+    clock = time.perf_counter_ns
+    start = clock()
+    engine.undo_move()
+    return [clock() - start]
+
+
+class HintBenchmark:
+    """ One cold expectimax search per board: the table is cleared first so runs are comparable. """
+
+    def __init__(self, depth=2, min_probability=0.01):
+        self.hint_engine = HintEngine(max_depth=depth, time_budget=float("inf"), min_probability=min_probability)
+
+    def __call__(self, engine, board):
+        self.hint_engine.table.clear()
+        return _time_call(engine, board, self.hint_engine.search)
+
+
+BENCHMARKS = {
+    "compress_and_merge": bench_compress_and_merge,
+    "move_up": bench_move_up,
+    "move_down": bench_move_down,
+    "move_left": bench_move_left,
+    "move_right": bench_move_right,
+    "add_new_tile": bench_add_new_tile,
+    "apply_special_tile_effects": bench_apply_special_tile_effects,
+    "check_game_over": bench_check_game_over,
+    "save_state": bench_save_state,
+    "undo_move": bench_undo_move,
+    "step": bench_step,
+    "get_hint": None,  # HintBenchmark, built with the search settings
+}
+
+
+def percentile(sorted_values, pct):
+    # Nearest-rank percentile of an already sorted list, as tournament.py reports them
+    rank = max(1, -(-pct * len(sorted_values) // 100))
+    return sorted_values[rank - 1]
+
+
+def stats(rounds):
+    """ ops/sec and per-call percentiles (microseconds) of per-round lists of nanosecond samples.
+
+    ops/sec is the best round's, like timeit: noise only ever slows a round
+    down. Within a round, calls over OUTLIER_FACTOR times its p90 are left
+    out of ops/sec; at these call lengths those are the OS preempting us,
+    and a single one outweighs thousands of calls. The percentiles are over
+    every call of every round.
+    """
+    best = None
+    outliers = 0
+    for samples in rounds:
+        ordered = sorted(samples)
+        limit = OUTLIER_FACTOR * percentile(ordered, 90)
+        kept = [s for s in ordered if s <= limit]
+        outliers += len(ordered) - len(kept)
+        total = sum(kept)
+        if total and (best is None or len(kept) / total > best):
+            best = len(kept) / total
+    ordered = sorted(s for samples in rounds for s in samples)
+    result = {
+        "calls": len(ordered),
+        "outliers": outliers,
+        "ops_per_sec": best * 1e9 if best else None,
+        "mean_us": sum(ordered) / len(ordered) / 1000,
+        "min_us": ordered[0] / 1000,
+    }
+    for p in PERCENTILES:
+        result[f"p{p}_us"] = percentile(ordered, p) / 1000
+    result["max_us"] = ordered[-1] / 1000
+    return result
+
+
+def run_benchmarks(names=None, corpora=None, boards=200, repeat=5, seed=0, size=4,
+                   hint_boards=20, hint_depth=2, progress=None):
+    """ Run the benchmarks and return the results dict that --output writes. """
+    names = names or list(BENCHMARKS)
+    corpora = corpora or CORPORA
+    overhead = _clock_overhead()
+    corpus_boards = {corpus: make_corpus(corpus, boards, seed, size) for corpus in corpora}
+    engine = GameEngine(size, seed=seed)
+    benches = {name: BENCHMARKS[name] or HintBenchmark(hint_depth) for name in names}
+    timed = {(name, corpus): [] for corpus in corpora for name in names}
+
+    def run(name, corpus, cases):
+        bench = benches[name]
+        samples = []
+        for board in cases:
+            samples.extend(bench(engine, board))
+        timed[(name, corpus)].append([max(0, s - overhead) for s in samples])
+
+    # One untimed pass fills lazy tables and caches
+    for corpus in corpora:
+        for name in names:
+            if name != "get_hint":
+                for board in corpus_boards[corpus]:
+                    benches[name](engine, board)
+
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        # Rounds go over every benchmark in turn, so a slow spell on the
+        # machine hits one round of everything rather than all of one benchmark
+        for round_index in range(repeat):
+            for corpus in corpora:
+                for name in names:
+                    cases = corpus_boards[corpus]
+                    if name == "get_hint":
+                        if round_index:
+                            continue  # searches take milliseconds, one round is plenty
+                        cases = cases[:hint_boards]
+                    if progress:
+                        progress(name, corpus, round_index)
+                    run(name, corpus, cases)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    results = {}
+    for name in names:
+        results[name] = {corpus: stats(timed[(name, corpus)]) for corpus in corpora}
+
+    return {
+        "meta": {
+            "seed": seed,
+            "boards": boards,
+            "repeat": repeat,
+            "grid_size": size,
+            "hint_boards": hint_boards,
+            "hint_depth": hint_depth,
+            "clock_overhead_ns": overhead,
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def format_results(report):
+    lines = [f"{'benchmark':<28}{'corpus':<14}{'ops/sec':>12}{'p50 us':>12}{'p90 us':>12}{'p99 us':>12}"]
+    for name, by_corpus in report["results"].items():
+        for corpus, s in by_corpus.items():
+            lines.append(f"{name:<28}{corpus:<14}{s['ops_per_sec'] or 0:>12.0f}"
+                         f"{s['p50_us']:>12.2f}{s['p90_us']:>12.2f}{s['p99_us']:>12.2f}")
+    return "\n".join(lines)
+
+
+def compare(baseline, report, threshold=0.1):
+    """ Lines comparing report to baseline, and the (name, corpus) pairs slower by more than threshold. """
+    lines = []
+    for key in ("seed", "boards", "grid_size", "hint_depth"):
+        if baseline["meta"].get(key) != report["meta"].get(key):
+            lines.append(f"warning: baseline was run with {key}={baseline['meta'].get(key)}, "
+                         f"this run with {key}={report['meta'].get(key)}")
+
+    lines.append(f"{'benchmark':<28}{'corpus':<14}{'baseline':>12}{'now':>12}{'change':>9}{'p50 change':>12}")
+    regressions = []
+    for name, by_corpus in report["results"].items():
+        for corpus, s in by_corpus.items():
+            old = baseline["results"].get(name, {}).get(corpus)
+            if old is None or not old["ops_per_sec"] or not s["ops_per_sec"]:
+                continue
+            change = s["ops_per_sec"] / old["ops_per_sec"] - 1
+            p50_change = s["p50_us"] / old["p50_us"] - 1 if old["p50_us"] else 0.0
+            flag = ""
+            if change < -threshold:
+                regressions.append((name, corpus))
+                flag = "  slower"
+            elif change > threshold:
+                flag = "  faster"
+            lines.append(f"{name:<28}{corpus:<14}{old['ops_per_sec']:>12.0f}{s['ops_per_sec']:>12.0f}"
+                         f"{change:>+9.1%}{p50_change:>+12.1%}{flag}")
+    return lines, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="benchmark", description="Time the engine's hot paths on seeded boards.")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="benchmarks to run (default: all)")
+    parser.add_argument("--corpora", nargs="+", choices=CORPORA, default=CORPORA)
+    parser.add_argument("--boards", type=int, default=200, help="boards per corpus")
+    parser.add_argument("--repeat", type=int, default=5, help="passes over each corpus")
+    parser.add_argument("--seed", type=int, default=0, help="corpus seed")
+    parser.add_argument("--size", type=int, default=4, help="grid size")
+    parser.add_argument("--hint-boards", type=int, default=20, help="boards per corpus for get_hint")
+    parser.add_argument("--hint-depth", type=int, default=2, help="search depth for get_hint")
+    parser.add_argument("--output", metavar="PATH", help="write the results as JSON")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare with a JSON file written by --output")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="ops/sec drop counted as a regression (default: 0.1 = 10%%)")
+    args = parser.parse_args(argv)
+
+    def progress(name, corpus, round_index):
+        print(f"\rround {round_index + 1}/{args.repeat} {corpus:<14}{name:<28}", end="", file=sys.stderr, flush=True)
+
+    report = run_benchmarks(args.only, args.corpora, args.boards, args.repeat, args.seed, args.size,
+                            args.hint_boards, args.hint_depth, progress=progress)
+    print(file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if not args.compare:
+        print(format_results(report))
+        return 0
+
+    with open(args.compare) as f:
+        baseline = json.load(f)
+    lines, regressions = compare(baseline, report, args.threshold)
+    print("\n".join(lines))
+    if regressions:
+        print(f"{len(regressions)} regressions beyond {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,349 @@
+""" Compact 4x4 board representation for fast moves.
+
+A board is packed into one 64-bit int holding the log2 of every tile in a
+4-bit nibble (0 means empty, 1 means 2, ... 15 means 32768). Cell (row, col)
+lives at bit offset 4 * (4 * row + col), so each row is a 16-bit chunk with
+column 0 in the lowest nibble. Left and right moves are four lookups in
+65,536-entry row tables; up and down transpose the board first.
+
+The tables are generated from game_engine.merge_line, so results match
+GameEngine.compress_and_merge on boards without special tiles. Building
+the row tables takes over a second, so they are read from the prebuilt
+file when there is one, and a window can start preload_tables() so the
+first move doesn't wait for them (GameEngine.move uses the list rules
+while tables_pending()).
+
+Lines holding frozen tiles use a second set of tables keyed by
+(packed row, 4-bit frozen mask). Those entries are filled lazily on first
+use, or all at once from a prebuilt file written by running this module.
+The file starts with a header (TABLES_HEADER: magic, format version, line
+length, table count, entries per table), then the six row tables and the
+frozen-aware tables; a file whose header or size doesn't match is ignored
+and the tables are built as if it were missing.
+"""
+
+import os
+import struct
+import threading
+from array import array
+
+ROW_MASK = 0xFFFF
+MAX_EXPONENT = 15  # largest tile a nibble can hold is 2 ** 15
+
+# Row tables, loaded or built on first use
+_left_tables = None
+_right_tables = None
+_preload_thread = None
+# Array type codes of the row tables as stored in the file: moves, scores, merge counts
+_ROW_TYPECODES = ('H', 'I', 'B')
+
+# Frozen-aware line tables: frozen mask -> array of packed entries
+# (new row | merge count << 16 | score << 19), _UNSET until computed
+TABLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "move_tables.bin")
+TABLES_MAGIC = b"M48T"
+# Goes up whenever the file layout or the line rules change, so stale files are rebuilt
+TABLES_VERSION = 2
+TABLES_HEADER = struct.Struct("<4sBBHI")
+_UNSET = (1 << 64) - 1
+_line_tables = {}
+_tables_loaded = False
+
+# Tile value <-> nibble. 32768 is left out on purpose so lines holding it
+# fall back to the list rules instead of risking a nibble overflow.
+_EXPONENTS = {0: 0}
+_EXPONENTS.update({1 << e: e for e in range(1, MAX_EXPONENT)})
+_VALUES = [0] + [1 << e for e in range(1, MAX_EXPONENT + 1)]
+_ALL_EXPONENTS = dict(_EXPONENTS)
+_ALL_EXPONENTS[1 << MAX_EXPONENT] = MAX_EXPONENT
+
+
+def tile_exponent(value):
+    # log2 of a tile value, 0 for an empty cell
+    if value == 0:
+        return 0
+    exponent = value.bit_length() - 1
+    if value != 1 << exponent or exponent > MAX_EXPONENT:
+        raise ValueError(f"Tile {value} can't be stored in a bitboard")
+    return exponent
+
+
+def pack_row(values):
+    row = 0
+    for col, value in enumerate(values):
+        row |= tile_exponent(value) << (4 * col)
+    return row
+
+
+def unpack_row(row):
+    return [(1 << ((row >> (4 * col)) & 0xF)) & ~1 for col in range(4)]
+
+
+def pack_grid(grid):
+    board = 0
+    shift = 0
+    try:
+        for row in grid:
+            for value in row:
+                board |= _ALL_EXPONENTS[value] << shift
+                shift += 4
+    except KeyError:
+        raise ValueError("Grid has a tile that can't be stored in a bitboard")
+    return board
+
+
+def unpack_board(board):
+    return [unpack_row((board >> (16 * i)) & ROW_MASK) for i in range(4)]
+
+
+def reverse_row(row):
+    return ((row & 0xF) << 12) | ((row & 0xF0) << 4) | ((row >> 4) & 0xF0) | (row >> 12)
+
+
+def transpose(board):
+    # Swap cell (i, j) with cell (j, i) using masked nibble shifts
+    a1 = board & 0xF0F00F0FF0F00F0F
+    a2 = board & 0x0000F0F00000F0F0
+    a3 = board & 0x0F0F00000F0F0000
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & 0xFF00FF0000FF00FF
+    b2 = a & 0x00FF00FF00000000
+    b3 = a & 0x00000000FF00FF00
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+
+def _overflows(row):
+    # True if a left move of this row would merge two tiles of the largest size
+    tiles = [(row >> (4 * col)) & 0xF for col in range(4)]
+    tiles = [t for t in tiles if t]
+    return any(a == b == MAX_EXPONENT for a, b in zip(tiles, tiles[1:]))
+
+
+def _build_row_tables():
+    global _left_tables, _right_tables
+    from game_engine import merge_line
+
+    row_left = [0] * 65536
+    left_score = [0] * 65536
+    left_merges = [0] * 65536
+
+    for row in range(65536):
+        if _overflows(row):
+            # Two 32768 tiles would overflow the nibble; leave the row untouched
+            row_left[row] = row
+            continue
+        new_line, merged_values = merge_line(unpack_row(row), [])
+        row_left[row] = pack_row(new_line)
+        left_score[row] = sum(merged_values)
+        left_merges[row] = len(merged_values)
+
+    # Moving right is moving the mirrored row left
+    row_right = [0] * 65536
+    right_score = [0] * 65536
+    right_merges = [0] * 65536
+    for row in range(65536):
+        rev = reverse_row(row)
+        row_right[row] = reverse_row(row_left[rev])
+        right_score[row] = left_score[rev]
+        right_merges[row] = left_merges[rev]
+
+    # _left_tables last: other threads take it being set as the tables being ready
+    _right_tables = (row_right, right_score, right_merges)
+    _left_tables = (row_left, left_score, left_merges)
+
+
+def row_tables():
+    # ((moves, scores, merges) for left, same for right), from the prebuilt file or built on first call
+    if _left_tables is None:
+        if not _tables_loaded:
+            load_tables()
+        if _left_tables is None:
+            _build_row_tables()
+    return _left_tables, _right_tables
+
+
+def preload_tables():
+    """ Load or build the row tables in a background thread, if they aren't ready yet. """
+    global _preload_thread
+    if _left_tables is None and _preload_thread is None:
+        _preload_thread = threading.Thread(target=row_tables, name="move-tables", daemon=True)
+        _preload_thread.start()
+
+
+def tables_pending():
+    # True while preload_tables() is still at work; moves should not wait for it
+    return _left_tables is None and _preload_thread is not None and _preload_thread.is_alive()
+
+
+def move_rows(board, tables):
+    moves, scores, merge_counts = tables
+    new_board = 0
+    score = 0
+    merges = 0
+    for shift in (0, 16, 32, 48):
+        row = (board >> shift) & ROW_MASK
+        new_board |= moves[row] << shift
+        score += scores[row]
+        merges += merge_counts[row]
+    return new_board, score, merges
+
+
+def move_board(board, direction):
+    """ Apply a move to a packed board.
+
+    Returns (new_board, score_gained, merge_count). The board is unchanged
+    when new_board == board.
+    """
+    left, right = row_tables()
+    if direction == "Left":
+        return move_rows(board, left)
+    elif direction == "Right":
+        return move_rows(board, right)
+    elif direction == "Up":
+        new_board, score, merges = move_rows(transpose(board), left)
+        return transpose(new_board), score, merges
+    elif direction == "Down":
+        new_board, score, merges = move_rows(transpose(board), right)
+        return transpose(new_board), score, merges
+    return board, 0, 0
+
+
+def _line_entry(row, frozen_mask):
+    from game_engine import merge_line
+
+    frozen_cells = [col for col in range(4) if frozen_mask >> col & 1]
+    new_line, merged_values = merge_line(unpack_row(row), frozen_cells)
+    return pack_row(new_line) | (len(merged_values) << 16) | (sum(merged_values) << 19)
+
+
+def _line_table(frozen_mask):
+    table = _line_tables.get(frozen_mask)
+    if table is None:
+        if not _tables_loaded:
+            load_tables()
+            table = _line_tables.get(frozen_mask)
+        if table is None:
+            table = _line_tables[frozen_mask] = array('Q', [_UNSET]) * 65536
+    return table
+
+
+def slide_line(line, frozen_mask):
+    """ Table lookup equivalent of merge_line for a line of four tiles.
+
+    frozen_mask has bit i set when cell i is frozen. Returns
+    (new_line, score_gained, merge_count, merged), or None when the line
+    holds a tile the tables don't cover.
+    """
+    try:
+        row = (_EXPONENTS[line[0]] | _EXPONENTS[line[1]] << 4 |
+               _EXPONENTS[line[2]] << 8 | _EXPONENTS[line[3]] << 12)
+    except KeyError:
+        return None
+
+    table = _line_table(frozen_mask)
+    entry = table[row]
+    if entry == _UNSET:
+        entry = table[row] = _line_entry(row, frozen_mask)
+
+    new_row = entry & ROW_MASK
+    merges = (entry >> 16) & 0x7
+    new_line = [_VALUES[new_row & 0xF], _VALUES[(new_row >> 4) & 0xF],
+                _VALUES[(new_row >> 8) & 0xF], _VALUES[new_row >> 12]]
+    return new_line, entry >> 19, merges, merges > 0
+
+
+def build_line_tables():
+    # Fill every (row, frozen mask) entry slide_line can reach, i.e. rows without a 32768
+    rows = [row for row in range(65536)
+            if all((row >> (4 * col)) & 0xF != MAX_EXPONENT for col in range(4))]
+    for frozen_mask in range(16):
+        table = _line_table(frozen_mask)
+        for row in rows:
+            if table[row] == _UNSET:
+                table[row] = _line_entry(row, frozen_mask)
+
+
+def _tables_size():
+    # Bytes of a tables file after its header
+    row_bytes = sum(array(code).itemsize for code in _ROW_TYPECODES) * 65536
+    return 2 * row_bytes + 16 * 65536 * array('Q').itemsize
+
+
+def save_tables(path=TABLES_PATH):
+    build_line_tables()
+    with open(path, "wb") as f:
+        f.write(TABLES_HEADER.pack(TABLES_MAGIC, TABLES_VERSION, 4, 16, 65536))
+        for tables in row_tables():
+            for code, table in zip(_ROW_TYPECODES, tables):
+                array(code, table).tofile(f)
+        for frozen_mask in range(16):
+            _line_tables[frozen_mask].tofile(f)
+
+
+def load_tables(path=TABLES_PATH):
+    # Load prebuilt row and frozen-aware tables if the file exists and matches, returns True on success
+    global _tables_loaded, _left_tables, _right_tables
+    _tables_loaded = True
+    if not os.path.exists(path):
+        return False
+
+    row = []
+    tables = {}
+    try:
+        with open(path, "rb") as f:
+            header = f.read(TABLES_HEADER.size)
+            expected = TABLES_HEADER.pack(TABLES_MAGIC, TABLES_VERSION, 4, 16, 65536)
+            if header != expected or os.fstat(f.fileno()).st_size != len(expected) + _tables_size():
+                return False  # another layout or older rules; build instead
+            for _ in range(2):
+                for code in _ROW_TYPECODES:
+                    table = array(code)
+                    table.fromfile(f, 65536)
+                    row.append(table.tolist())  # lists index faster than arrays
+            for frozen_mask in range(16):
+                table = array('Q')
+                table.fromfile(f, 65536)
+                tables[frozen_mask] = table
+    except (OSError, EOFError):
+        return False
+
+    _line_tables.update(tables)
+    if _left_tables is None:
+        _right_tables = tuple(row[3:])
+        _left_tables = tuple(row[:3])
+    return True
+
+
+def max_exponent(board):
+    return max((board >> shift) & 0xF for shift in range(0, 64, 4))
+
+
+def has_max_tile(board):
+    # True if any nibble is 15 (all four of its bits set)
+    return (board & (board >> 1) & (board >> 2) & (board >> 3) & 0x1111111111111111) != 0
+
+
+def empty_cells(board):
+    # Cell indexes (4 * row + col) of empty nibbles
+    return [idx for idx in range(16) if not (board >> (4 * idx)) & 0xF]
+
+
+def zero_nibbles(x):
+    # Bit 4k of the result is set when nibble k of x is zero
+    return ~(x | (x >> 1) | (x >> 2) | (x >> 3)) & 0x1111111111111111
+
+
+# Row of zero_nibbles flags (bits 0, 4, 8, 12) -> the same flags packed into bits 0-3
+_ROW_FLAGS = {sum(1 << (4 * col) for col in range(4) if bits >> col & 1): bits for bits in range(16)}
+
+
+def empty_mask(board):
+    # Bit 4 * row + col set for every empty cell, the layout GameEngine.empty_mask uses
+    flags = zero_nibbles(board)
+    return (_ROW_FLAGS[flags & ROW_MASK] | _ROW_FLAGS[(flags >> 16) & ROW_MASK] << 4 |
+            _ROW_FLAGS[(flags >> 32) & ROW_MASK] << 8 | _ROW_FLAGS[flags >> 48] << 12)
+
+
+if __name__ == "__main__":
+    # Prebuild the row and frozen-aware tables so games don't build them lazily
+    save_tables()
+    print(f"Wrote {TABLES_PATH}")
@@ -0,0 +1,216 @@
+""" Board renderer that draws every tile on a single tk.Canvas.
+
+The label renderer in Enhanced-2048.py uses a Frame and a Label per cell;
+this one creates a fixed set of canvas items up front (an empty slot and a
+tile rectangle plus text per cell) and only reconfigures or moves them, so
+the cost of a frame does not grow with widget count on large boards.
+
+Moves can be animated: tiles slide from where GameEngine.slide_paths says
+they start to where they end up, then merged tiles pop. Frames are
+scheduled with after() every FRAME_MS; positions are interpolated from the
+wall clock, so late frames simply skip ahead, and a frame that takes longer
+than FRAME_BUDGET_MS to draw ends the animation by snapping to the final
+board. A new move or redraw also snaps any running animation first.
+"""
+
+import time
+import tkinter as tk
+
+FRAME_MS = 16  # ~60 frames per second
+FRAME_BUDGET_MS = 10  # drawing one frame slower than this means we're under load
+SLIDE_MS = 100
+POP_MS = 90
+POP_SCALE = 0.12  # merged tiles grow by up to 12% of the cell size
+
+
+class CanvasBoard:
+    def __init__(self, parent, grid_size, cell_size, padding, tile_style):
+        self.grid_size = grid_size
+        self.cell_size = cell_size
+        self.padding = padding
+        self.pitch = cell_size + 2 * padding
+        # tile_style(value, special_type) -> (text, font, fg, bg), as used by the label
+        # renderer, with fonts already sized for cell_size
+        self.tile_style = tile_style
+
+        side = self.pitch * grid_size
+        self.canvas = tk.Canvas(parent, width=side, height=side, highlightthickness=0, bd=0)
+        self.canvas.pack()
+
+        # Empty slots underneath, tiles on top; the item ids are reused for the whole game
+        self.slots = []
+        self.tiles = []
+        for i in range(grid_size):
+            slot_row = []
+            tile_row = []
+            for j in range(grid_size):
+                x0, y0, x1, y1 = self.cell_box(i, j)
+                slot_row.append(self.canvas.create_rectangle(x0, y0, x1, y1, width=0))
+                rect = self.canvas.create_rectangle(x0, y0, x1, y1, width=0, state="hidden")
+                text = self.canvas.create_text((x0 + x1) / 2, (y0 + y1) / 2, state="hidden")
+                tile_row.append((rect, text))
+            self.slots.append(slot_row)
+            self.tiles.append(tile_row)
+
+        self.rendered = None  # (value, special type) drawn in each cell
+        self.colors = None  # (style key, board color, empty color) the slots were drawn with
+        self.pending = None  # final board of the running animation
+        self.animation = None
+        self.after_id = None
+
+        # Frame statistics, for tuning the budget
+        self.frames_drawn = 0
+        self.frames_skipped = 0
+
+    def cell_box(self, i, j):
+        x0 = j * self.pitch + self.padding
+        y0 = i * self.pitch + self.padding
+        return x0, y0, x0 + self.cell_size, y0 + self.cell_size
+
+    def invalidate(self):
+        # Next render redraws every cell
+        self.rendered = None
+        self.colors = None
+
+    def render(self, grid, special_tiles, style_key, board_color, empty_color, paths=None):
+        """ Show the given board, only touching cells that changed.
+
+        style_key identifies the theme tile_style draws with. With paths
+        (from GameEngine.slide_paths, taken before the move) the change is
+        animated instead of drawn at once.
+        """
+        self.finish()
+        if self.colors != (style_key, board_color, empty_color):
+            self.colors = (style_key, board_color, empty_color)
+            self.rendered = None
+            self.canvas.config(bg=board_color)
+            for slot_row in self.slots:
+                for slot in slot_row:
+                    self.canvas.itemconfig(slot, fill=empty_color)
+
+        state = [[(grid[i][j], special_tiles[(i, j)]['type'] if (i, j) in special_tiles else None)
+                  for j in range(self.grid_size)] for i in range(self.grid_size)]
+        if paths and self.rendered is not None:
+            self.start_animation(paths, state)
+        else:
+            self.draw(state)
+
+    def draw(self, state):
+        rendered = self.rendered
+        if rendered is None:
+            rendered = self.rendered = [[None] * self.grid_size for _ in range(self.grid_size)]
+
+        itemconfig = self.canvas.itemconfig
+        for i in range(self.grid_size):
+            for j in range(self.grid_size):
+                cell = state[i][j]
+                if rendered[i][j] == cell:
+                    continue
+                rendered[i][j] = cell
+
+                rect, text = self.tiles[i][j]
+                value, special_type = cell
+                if value == 0 and special_type is None:
+                    itemconfig(rect, state="hidden")
+                    itemconfig(text, state="hidden")
+                    continue
+                cell_text, font, fg, bg = self.tile_style(value, special_type)
+                itemconfig(rect, fill=bg, state="normal")
+                itemconfig(text, text=cell_text, font=font, fill=fg, state="normal")
+
+    def place(self, i, j, x_offset=0.0, y_offset=0.0, grow=0.0):
+        # Position the tile items of cell (i, j), shifted and/or scaled
+        rect, text = self.tiles[i][j]
+        x0, y0, x1, y1 = self.cell_box(i, j)
+        self.canvas.coords(rect, x0 + x_offset - grow, y0 + y_offset - grow,
+                           x1 + x_offset + grow, y1 + y_offset + grow)
+        self.canvas.coords(text, (x0 + x1) / 2 + x_offset, (y0 + y1) / 2 + y_offset)
+
+    def start_animation(self, paths, state):
+        moving = [(src, dst) for src, dst in paths if src != dst]
+        arrivals = {}
+        for _, dst in paths:
+            arrivals[dst] = arrivals.get(dst, 0) + 1
+        merged = [dst for dst, count in arrivals.items() if count > 1]
+        if not moving and not merged:
+            self.draw(state)
+            return
+
+        # Moving tiles go on top so they slide over the ones they merge into
+        for (i, j), _ in moving:
+            rect, text = self.tiles[i][j]
+            self.canvas.tag_raise(rect)
+            self.canvas.tag_raise(text)
+
+        self.pending = state
+        now = time.perf_counter()
+        self.animation = {"moving": moving, "merged": merged, "start": now, "last": now, "sliding": True}
+        self.after_id = self.canvas.after(FRAME_MS, self.frame)
+
+    def frame(self):
+        self.after_id = None
+        anim = self.animation
+        if anim is None:
+            return
+
+        frame_start = time.perf_counter()
+        late = (frame_start - anim["last"]) * 1000
+        if late > 2 * FRAME_MS:
+            self.frames_skipped += int(late // FRAME_MS) - 1
+        anim["last"] = frame_start
+        elapsed = (frame_start - anim["start"]) * 1000
+
+        if anim["sliding"]:
+            progress = min(1.0, elapsed / SLIDE_MS)
+            # Ease out: fast start, gentle stop
+            eased = 1 - (1 - progress) ** 2
+            for (si, sj), (di, dj) in anim["moving"]:
+                self.place(si, sj, (dj - sj) * self.pitch * eased, (di - si) * self.pitch * eased)
+            if progress >= 1.0:
+                self.reset_moving()
+                self.draw(self.pending)
+                if not anim["merged"]:
+                    self.stop()
+                    return
+                anim["sliding"] = False
+                anim["start"] = frame_start
+        else:
+            progress = min(1.0, elapsed / POP_MS)
+            grow = POP_SCALE * self.cell_size * (1 - abs(2 * progress - 1))
+            for i, j in anim["merged"]:
+                self.place(i, j, grow=grow)
+            if progress >= 1.0:
+                for i, j in anim["merged"]:
+                    self.place(i, j)
+                self.stop()
+                return
+
+        self.frames_drawn += 1
+        draw_ms = (time.perf_counter() - frame_start) * 1000
+        if draw_ms > FRAME_BUDGET_MS:
+            # Can't keep up; show the final board instead of dropping more frames
+            self.finish()
+            return
+        self.after_id = self.canvas.after(max(1, int(FRAME_MS - draw_ms)), self.frame)
+
+    def reset_moving(self):
+        for (i, j), _ in self.animation["moving"]:
+            self.place(i, j)
+
+    def stop(self):
+        self.animation = None
+        self.pending = None
+
+    def finish(self):
+        # Jump to the end of a running animation
+        if self.after_id is not None:
+            self.canvas.after_cancel(self.after_id)
+            self.after_id = None
+        anim = self.animation
+        if anim is None:
+            return
+        self.reset_moving()
+        for i, j in anim["merged"]:
+            self.place(i, j)
+        self.draw(self.pending)
+        self.stop()
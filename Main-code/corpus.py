@@ -0,0 +1,298 @@
+""" Replay corpora: many games in one memory-mapped file.
+
+Layout (all little-endian):
+
+    FILE_HEADER   magic, version, keyframe interval, game count, keyframe
+                  count, offset of the game index, offset of the keyframe index
+    games         every game's replay bytes (the replay.py format, END
+                  included), each followed by its keyframe states
+    game index    GAME_ENTRY per game: replay offset, replay length, first
+                  keyframe, keyframe count
+    keyframe index  KEYFRAME_ENTRY per keyframe: event number, undo history
+                  depth at that point, offset of the state
+
+Game k's entry sits at a fixed position, so reading game k is one struct
+unpack plus parsing that game's bytes straight from the mmap; nothing else
+is loaded. Keyframes are engine states saved every `interval` events while
+the corpus is built, so position(k, m) restores the nearest usable keyframe
+at or before event m and replays from there instead of from move 0.
+
+A keyframe holds no undo history. It is only used for event m when no undo
+between it and m reaches back past it; the history depth at every event
+follows from the events alone (moves push, undos pop, redos push), so that
+check needs no replay. Keyframes are only taken while there is nothing to redo.
+
+    python corpus.py build replays.bin games.r48c --interval 128
+    python corpus.py show games.r48c --game 1000 --move 5000
+"""
+
+import os
+import sys
+import mmap
+import struct
+import argparse
+from bisect import bisect_right
+
+import replay
+from game_engine import GameEngine, Snapshot
+
+MAGIC = b"R48C"
+VERSION = 3
+FILE_HEADER = struct.Struct("<4sHIQQQQ")
+GAME_ENTRY = struct.Struct("<QIQI")
+KEYFRAME_ENTRY = struct.Struct("<IIQ")
+# score, moves, undo count, combo count, flags, rng key, rng counter, merge chain,
+# bomb kills, chaos events, number of special tiles, number of active missions
+KEYFRAME_STATE = struct.Struct("<QIHHBQQIIIHH")
+SPECIAL_ENTRY = struct.Struct("<BBBb")  # row, col, index into engine.special_types, turns
+MISSION_ENTRY = struct.Struct("<HI")  # index into engine.missions, baseline
+
+FLAG_CHAOS, FLAG_WON, FLAG_OVER = 1, 2, 4
+
+DEFAULT_INTERVAL = 256
+
+
+def encode_keyframe(engine):
+    snapshot = engine.snapshot()
+    active, baselines, merge_chain, bomb_kills, chaos_events = snapshot.mission
+    flags = ((FLAG_CHAOS if engine.chaos_mode else 0) | (FLAG_WON if engine.game_won else 0) |
+             (FLAG_OVER if engine.game_over else 0))
+    key, counter = snapshot.rng
+    size = engine.GRID_SIZE
+
+    parts = [snapshot.board.to_bytes(size * size, "little"),
+             KEYFRAME_STATE.pack(snapshot.score, engine.moves, engine.undo_count, engine.combo_count, flags,
+                                 key, counter, merge_chain, bomb_kills, chaos_events,
+                                 len(snapshot.specials), len(active))]
+    for (i, j), special_type, turns in snapshot.specials:
+        parts.append(SPECIAL_ENTRY.pack(i, j, engine.special_types.index(special_type), turns))
+    for index, baseline in zip(active, baselines):
+        parts.append(MISSION_ENTRY.pack(index, baseline))
+    return b"".join(parts)
+
+
+def decode_keyframe(record, data, pos):
+    # Engine for record restored from the keyframe state at data[pos:]
+    size = record.grid_size
+    board = int.from_bytes(data[pos:pos + size * size], "little")
+    pos += size * size
+    (score, moves, undo_count, combo_count, flags, key, counter, merge_chain, bomb_kills,
+     chaos_events, special_count, mission_count) = KEYFRAME_STATE.unpack_from(data, pos)
+    pos += KEYFRAME_STATE.size
+
+    engine = GameEngine(size, seed=record.seed)
+    engine.chaos_frequency = record.chaos_frequency
+    engine.undo_limit = record.undo_limit
+    engine.special_chance = record.special_chance
+    engine.seed = record.seed
+
+    specials = []
+    for _ in range(special_count):
+        i, j, type_index, turns = SPECIAL_ENTRY.unpack_from(data, pos)
+        pos += SPECIAL_ENTRY.size
+        specials.append(((i, j), engine.special_types[type_index], turns))
+    missions = [MISSION_ENTRY.unpack_from(data, pos + k * MISSION_ENTRY.size) for k in range(mission_count)]
+    mission = (tuple(index for index, _ in missions), tuple(baseline for _, baseline in missions),
+               merge_chain, bomb_kills, chaos_events)
+    engine.restore(Snapshot(board, score, tuple(specials), mission, (key, counter)))
+
+    engine.moves = moves
+    engine.undo_count = undo_count
+    engine.combo_count = combo_count
+    engine.chaos_mode = bool(flags & FLAG_CHAOS)
+    engine.game_won = bool(flags & FLAG_WON)
+    engine.game_over = bool(flags & FLAG_OVER)
+    return engine
+
+
+def history_depths(events):
+    # Undo history depth after each prefix of events: depths[i] is the depth after i events
+    depths = [0]
+    depth = 0
+    for event in events:
+        if event >= 0 or event == -replay.REDO:
+            depth += 1
+        elif event == -replay.UNDO:
+            depth -= 1
+        depths.append(depth)
+    return depths
+
+
+class CorpusWriter:
+    """ Streams games into a corpus file; the indexes are written by close(). """
+
+    def __init__(self, path, interval=DEFAULT_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.file = open(path, "wb")
+        self.file.write(b"\0" * FILE_HEADER.size)  # filled in by close()
+        self.games = []  # (offset, length, first keyframe, keyframe count)
+        self.keyframes = []  # (event number, history depth, offset)
+
+    def add_game(self, data):
+        """ Append one game given as its replay bytes. """
+        record, _ = replay.parse_game(data)
+        offset = self.file.tell()
+        self.file.write(data)
+
+        first = len(self.keyframes)
+        # A game played under older rules doesn't replay as recorded, so the
+        # history depths keyframes rely on can't be read off its events
+        if self.interval and record.version == replay.VERSION and len(record.events) >= self.interval:
+            self.add_keyframes(record)
+        self.games.append((offset, len(data), first, len(self.keyframes) - first))
+
+    def add_keyframes(self, record):
+        engine = replay.new_engine(record)
+        engine.keep_history = True
+        depth = 0
+        redoable = 0
+        for index, event in enumerate(record.events, 1):
+            replay.run_events(engine, (event,))
+            if event >= 0:
+                depth += 1
+                redoable = 0
+            elif event == -replay.UNDO:
+                depth -= 1
+                redoable += 1
+            elif event == -replay.REDO:
+                depth += 1
+                redoable -= 1
+            if index % self.interval == 0 and not redoable:
+                self.keyframes.append((index, depth, self.file.tell()))
+                self.file.write(encode_keyframe(engine))
+
+    def add_log(self, path):
+        # Append every game of a replay log
+        with open(path, "rb") as f:
+            data = f.read()
+        for _, start, end in replay.iter_games(data):
+            self.add_game(data[start:end])
+
+    def close(self):
+        index_offset = self.file.tell()
+        for entry in self.games:
+            self.file.write(GAME_ENTRY.pack(*entry))
+        keyframes_offset = self.file.tell()
+        for entry in self.keyframes:
+            self.file.write(KEYFRAME_ENTRY.pack(*entry))
+        self.file.seek(0)
+        self.file.write(FILE_HEADER.pack(MAGIC, VERSION, self.interval, len(self.games), len(self.keyframes),
+                                         index_offset, keyframes_offset))
+        self.file.close()
+
+
+class Corpus:
+    """ Read-only view of a corpus file through mmap. """
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.interval, self.game_count, self.keyframe_count,
+         self.index_offset, self.keyframes_offset) = FILE_HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a replay corpus")
+        if version != VERSION:
+            raise ValueError(f"{path} was written by an older corpus.py; rebuild it from its replay log")
+
+    def __len__(self):
+        return self.game_count
+
+    def entry(self, k):
+        if not -self.game_count <= k < self.game_count:
+            raise IndexError("game index out of range")
+        k %= self.game_count
+        return GAME_ENTRY.unpack_from(self.data, self.index_offset + k * GAME_ENTRY.size)
+
+    def raw(self, k):
+        # Replay bytes of game k, as a memoryview into the map
+        offset, length, _, _ = self.entry(k)
+        return memoryview(self.data)[offset:offset + length]
+
+    def __getitem__(self, k):
+        offset, _, _, _ = self.entry(k)
+        return replay.parse_game(self.data, offset)[0]
+
+    def __iter__(self):
+        # Streams games in order; only the current one is decoded
+        for k in range(self.game_count):
+            yield self[k]
+
+    def keyframes(self, k):
+        # (event number, history depth, state offset) of game k's keyframes
+        _, _, first, count = self.entry(k)
+        base = self.keyframes_offset + first * KEYFRAME_ENTRY.size
+        return [KEYFRAME_ENTRY.unpack_from(self.data, base + n * KEYFRAME_ENTRY.size) for n in range(count)]
+
+    def position(self, k, move):
+        """ Engine holding game k after its first `move` events. """
+        record = self[k]
+        events = record.events
+        move = max(0, min(move, len(events)))
+
+        keyframes = self.keyframes(k)
+        start = bisect_right([event for event, _, _ in keyframes], move)
+        if start:
+            depths = history_depths(events[:move])
+            lowest = depths[move]
+            for event, depth, offset in reversed(keyframes[:start]):
+                # Depths between the keyframe and the target, exclusive of the keyframe itself
+                lowest = min([lowest] + depths[event + 1:move + 1])
+                if lowest >= depth:
+                    engine = decode_keyframe(record, self.data, offset)
+                    engine.keep_history = -replay.UNDO in events[event:move]
+                    return replay.run_events(engine, events[event:move])
+
+        return replay.run_events(replay.new_engine(record), events[:move])
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="corpus", description="Build and read replay corpora.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="pack replay logs into a corpus")
+    build.add_argument("logs", nargs="+")
+    build.add_argument("output")
+    build.add_argument("--interval", type=int, default=DEFAULT_INTERVAL, help="events between keyframes (0: none)")
+    info = commands.add_parser("info")
+    info.add_argument("path")
+    show = commands.add_parser("show", help="print a position")
+    show.add_argument("path")
+    show.add_argument("--game", type=int, default=0)
+    show.add_argument("--move", type=int, default=None, help="events to play (default: all)")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        writer = CorpusWriter(args.output, args.interval)
+        for log in args.logs:
+            writer.add_log(log)
+        writer.close()
+        print(f"{len(writer.games)} games, {len(writer.keyframes)} keyframes, "
+              f"{os.path.getsize(args.output)} bytes")
+        return 0
+
+    with Corpus(args.path) as corpus:
+        if args.command == "info":
+            print(f"{len(corpus)} games, {corpus.keyframe_count} keyframes every {corpus.interval} events")
+            return 0
+
+        record = corpus[args.game]
+        engine = corpus.position(args.game, len(record.events) if args.move is None else args.move)
+        print(record)
+        for row in engine.grid:
+            print(" ".join(f"{value:>6}" for value in row))
+        print(f"score {engine.score}, moves {engine.moves}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
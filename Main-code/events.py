@@ -0,0 +1,89 @@
+""" Typed game events and the bus that delivers them.
+
+GameEngine.events is None unless something wants to hear about milestones,
+so headless runs pay one `is not None` test per milestone and build no
+event objects. Attach an EventBus and subscribe per event type:
+
+    bus = EventBus()
+    bus.subscribe(GameOver, lambda event: print(event.text))
+    engine.events = bus
+
+Handlers run synchronously, in the middle of GameEngine.step(), so they
+should only note the event (the window queues a toast for its next frame)
+and not touch the engine. Every event has a title and a text for display.
+"""
+
+from collections import namedtuple
+
+
+class TileReached(namedtuple("TileReached", ["value"])):
+    """ The board got its first tile of `value` this game (2048, the winning tile). """
+    __slots__ = ()
+    title = "Congratulations"
+
+    @property
+    def text(self):
+        return f"You've reached {self.value}!"
+
+
+class ChaosTriggered(namedtuple("ChaosTriggered", ["event_type"])):
+    """ Chaos mode altered the board; event_type is the name trigger_chaos_event() picked. """
+    __slots__ = ()
+    title = "Chaos Mode"
+    text = "Chaos event triggered! The board has been altered."
+
+
+class MissionCompleted(namedtuple("MissionCompleted", ["mission_type", "description", "reward"])):
+    """ The current mission was completed; reward describes what it gave. """
+    __slots__ = ()
+    title = "Mission Complete"
+
+    @property
+    def text(self):
+        return f"Mission completed: {self.description}!\n{self.reward}"
+
+
+class GameOver(namedtuple("GameOver", ["score"])):
+    """ No move is left. """
+    __slots__ = ()
+    title = "Game Over"
+
+    @property
+    def text(self):
+        return f"Game Over! Your score: {self.score}"
+
+
+class TimeUp(namedtuple("TimeUp", ["score"])):
+    """ The timed-mode clock ran out. """
+    __slots__ = ()
+    title = "Time's Up"
+
+    @property
+    def text(self):
+        return f"Time's up! Your score: {self.score}"
+
+
+EVENT_TYPES = (TileReached, ChaosTriggered, MissionCompleted, GameOver, TimeUp)
+
+
+class EventBus:
+    """ Calls the handlers subscribed to an event's type, in subscription order. """
+
+    def __init__(self):
+        self.handlers = {}  # event type -> list of handlers
+
+    def subscribe(self, event_type, handler):
+        self.handlers.setdefault(event_type, []).append(handler)
+
+    def subscribe_all(self, handler):
+        for event_type in EVENT_TYPES:
+            self.subscribe(event_type, handler)
+
+    def unsubscribe(self, event_type, handler):
+        handlers = self.handlers.get(event_type)
+        if handlers and handler in handlers:
+            handlers.remove(handler)
+
+    def emit(self, event):
+        for handler in self.handlers.get(type(event), ()):
+            handler(event)
@@ -0,0 +1,1233 @@
+from operator import eq
+from collections import namedtuple
+
+import bitboard
+from events import TileReached, ChaosTriggered, MissionCompleted, GameOver, TimeUp
+from rng import GameRandom, new_seed
+
+
+# Missions are data: a description, a type from MISSION_KINDS, a goal_value and
+# a reward ("undo", "bomb" or "points", optionally with a reward_amount).
+# Engines only read them, so the same dicts can be shared.
+DEFAULT_MISSIONS = [
+    {"description": "Merge a 64 tile", "goal_value": 64, "type": "merge", "reward": "undo"},
+    {"description": "Make 3 merges in one move", "goal_value": 3, "type": "combo", "reward": "bomb"},
+    {"description": "Reach 500 points", "goal_value": 500, "type": "score", "reward": "points"}
+]
+
+# More missions, e.g. GameEngine(missions=DEFAULT_MISSIONS + EXTRA_MISSIONS)
+EXTRA_MISSIONS = [
+    {"description": "Merge on 5 moves in a row", "goal_value": 5, "type": "chain",
+     "reward": "points", "reward_amount": 100},
+    {"description": "Clear 6 tiles with bombs", "goal_value": 6, "type": "bomb_kills", "reward": "undo"},
+    {"description": "Survive 3 chaos events", "goal_value": 3, "type": "chaos", "reward": "bomb"}
+]
+
+# What each type of mission measures: the engine counter its progress is read
+# from (kept up to date as the game is played, so checking a mission is one
+# comparison), whether progress counts from when the mission was assigned
+# rather than over the whole game, and how the window shows it.
+MISSION_KINDS = {
+    "merge": {"counter": "highest_tile", "progress": "Highest tile = {value}/{goal}"},
+    "combo": {"counter": "combo_count", "progress": "{value}/{goal} merges in one move"},
+    "score": {"counter": "score", "progress": "{value}/{goal} points"},
+    "chain": {"counter": "merge_chain", "progress": "{value}/{goal} merging moves in a row"},
+    "bomb_kills": {"counter": "bomb_kills", "since_assigned": True,
+                   "progress": "{value}/{goal} tiles cleared by bombs"},
+    "chaos": {"counter": "chaos_events", "since_assigned": True,
+              "progress": "{value}/{goal} chaos events survived"},
+}
+
+DIRECTIONS = ["Up", "Down", "Left", "Right"]
+
+# Immutable undo snapshot. board is the grid packed one byte per cell (log2 of
+# the tile, row by row, cell (0, 0) lowest); specials is a tuple of
+# (pos, type, turns), oldest special tile first; mission is (active mission
+# indexes, their baselines, merge_chain, bomb_kills, chaos_events); counters is
+# (empty_mask, merge_pairs, highest_tile), or None to have restore() count them again.
+Snapshot = namedtuple("Snapshot", ["board", "score", "specials", "mission", "rng", "counters"],
+                      defaults=(None,))
+
+_LOG2 = {0: 0}
+_LOG2.update({1 << e: e for e in range(1, 64)})
+_POW2 = [0] + [1 << e for e in range(1, 64)]
+
+
+def pack_board(grid):
+    return int.from_bytes(bytes([_LOG2[value] for row in grid for value in row]), "little")
+
+
+def unpack_board(board, size):
+    cells = board.to_bytes(size * size, "little")
+    return [[_POW2[e] for e in cells[i * size:(i + 1) * size]] for i in range(size)]
+
+
+def merge_line(line, frozen_cells):
+    """ Slide and merge one line towards index 0, leaving frozen cells in place.
+
+    Returns the new line and the list of values produced by merges, in order.
+    This is the single source of truth for line rules; the bitboard move
+    tables are generated from it.
+    """
+    if not frozen_cells:
+        # Nothing pinned: pack the tiles, then merge equal neighbours left to
+        # right. Same result as the passes below, in one walk over the tiles.
+        tiles = [value for value in line if value]
+        final_line = []
+        merged_values = []
+        k = 0
+        count = len(tiles)
+        while k < count:
+            value = tiles[k]
+            if k + 1 < count and tiles[k + 1] == value:
+                value *= 2
+                merged_values.append(value)
+                k += 2
+            else:
+                k += 1
+            final_line.append(value)
+        final_line.extend([0] * (len(line) - len(final_line)))
+        return final_line, merged_values
+
+    frozen_cells = set(frozen_cells)
+
+    # Remove zeros and pack values together, skipping frozen cells
+    new_line = [0] * len(line)
+    idx = 0
+
+    # First pass: compress
+    for i in range(len(line)):
+        if i in frozen_cells:
+            # Keep frozen cells in place
+            new_line[i] = line[i]
+        elif line[i] != 0:
+            # Find next non-frozen position
+            while idx in frozen_cells and idx < len(line):
+                new_line[idx] = line[idx]  # Keep the frozen value
+                idx += 1
+
+            if idx < len(line):
+                new_line[idx] = line[i]
+                idx += 1
+
+    # Second pass: merge
+    merged_values = []
+    for i in range(len(new_line) - 1):
+        if i in frozen_cells or i + 1 in frozen_cells:
+            continue
+
+        if new_line[i] != 0 and new_line[i] == new_line[i + 1]:
+            # Merge tiles
+            new_line[i] *= 2
+            new_line[i + 1] = 0
+            merged_values.append(new_line[i])
+
+    # Final pass: compress again after merging
+    final_line = [0] * len(line)
+    idx = 0
+    for i in range(len(new_line)):
+        if i in frozen_cells:
+            final_line[i] = new_line[i]
+        elif new_line[i] != 0:
+            # Find next non-frozen position
+            while idx in frozen_cells and idx < len(final_line):
+                final_line[idx] = new_line[idx]  # Keep the frozen value
+                idx += 1
+
+            if idx < len(final_line):
+                final_line[idx] = new_line[i]
+                idx += 1
+
+    return final_line, merged_values
+
+
+def line_paths(line, frozen_cells):
+    """ Where every tile of a line ends up when merge_line moves it.
+
+    Follows the same passes as merge_line, but tracks tiles instead of
+    values. Returns (from_index, to_index) pairs for every non-empty cell;
+    two pairs share a to_index when those tiles merged.
+    """
+    n = len(line)
+
+    def compress(values, origins):
+        packed = [0] * n
+        packed_origins = [[] for _ in range(n)]
+        idx = 0
+        for i in range(n):
+            if i in frozen_cells:
+                packed[i] = values[i]
+                packed_origins[i] = origins[i]
+            elif values[i] != 0:
+                while idx in frozen_cells and idx < n:
+                    idx += 1
+                if idx < n:
+                    packed[idx] = values[i]
+                    packed_origins[idx] = origins[i]
+                    idx += 1
+        return packed, packed_origins
+
+    values, origins = compress(line, [[i] if line[i] else [] for i in range(n)])
+    for i in range(n - 1):
+        if i in frozen_cells or i + 1 in frozen_cells:
+            continue
+        if values[i] != 0 and values[i] == values[i + 1]:
+            values[i] *= 2
+            values[i + 1] = 0
+            origins[i] = origins[i] + origins[i + 1]
+            origins[i + 1] = []
+    values, origins = compress(values, origins)
+
+    return [(src, dst) for dst in range(n) for src in origins[dst]]
+
+
+_NEIGHBORS = {}  # grid size -> neighbours of every cell, indexed by i * size + j
+_EDGE_MASKS = {}  # grid size -> (cells not in the first column, cells not in the last column)
+_POPCOUNT8 = [bin(b).count("1") for b in range(256)]
+
+
+def neighbors(size):
+    table = _NEIGHBORS.get(size)
+    if table is None:
+        table = _NEIGHBORS[size] = [
+            [(ni, nj) for ni, nj in ((i - 1, j), (i + 1, j), (i, j - 1), (i, j + 1))
+             if 0 <= ni < size and 0 <= nj < size]
+            for i in range(size) for j in range(size)]
+    return table
+
+
+def surrounding_mask(mask, size):
+    # Cells of mask plus the eight around each one, bit i * size + j per cell
+    edges = _EDGE_MASKS.get(size)
+    if edges is None:
+        first = sum(1 << (i * size) for i in range(size))
+        full = (1 << (size * size)) - 1
+        edges = _EDGE_MASKS[size] = (full ^ first, full ^ (first << (size - 1)))
+    not_first, not_last = edges
+    wide = mask | (mask << 1 & not_first) | (mask >> 1 & not_last)
+    return (wide | wide << size | wide >> size) & ((1 << (size * size)) - 1)
+
+
+def reverse_bits(mask, size):
+    # The low `size` bits of mask in the opposite order, for lines read from the far end
+    return int(f"{mask:0{size}b}"[::-1], 2) if mask else 0
+
+
+def popcount(mask):
+    return bin(mask).count("1")
+
+
+if hasattr(int, "bit_count"):
+    popcount = int.bit_count  # Python 3.10+
+
+
+def nth_bit(mask, n):
+    # Index of the n-th (from 0) set bit of mask, counting from the lowest; a byte at a time
+    base = 0
+    count = _POPCOUNT8[mask & 0xFF]
+    while n >= count:
+        n -= count
+        mask >>= 8
+        base += 8
+        count = _POPCOUNT8[mask & 0xFF]
+    for _ in range(n):
+        mask &= mask - 1
+    return base + (mask & -mask).bit_length() - 1
+
+
+class MoveResult:
+    """ Outcome of a single GameEngine.step() call. """
+
+    def __init__(self, direction):
+        self.direction = direction
+        self.moved = False
+        self.score_gained = 0
+        self.combo = 0
+        self.chaos_event = None
+        self.game_over = False
+
+    def __repr__(self):
+        return (f"MoveResult(direction={self.direction!r}, moved={self.moved}, "
+                f"score_gained={self.score_gained}, game_over={self.game_over})")
+
+
+class GameEngine:
+    """ Rules of Enhanced 2048 without any Tk dependency.
+
+    Holds the grid, score, special tiles, missions and chaos logic. The Tk
+    window in Enhanced-2048.py is only a view over an instance of this class,
+    so simulations, solvers and tests can drive it directly through step().
+    """
+
+    def __init__(self, grid_size=4, seed=None, missions=None):
+        # Game constants
+        self.GRID_SIZE = grid_size
+
+        # Every random choice goes through self.rng; self.seed reproduces the current game
+        self.seed = new_seed() if seed is None else seed
+        self.rng = GameRandom(self.seed)
+
+        # Game variables
+        self.score = 0
+        self.high_score = 0
+        self.moves = 0
+        self.game_over = False
+        self.game_won = False
+        self.time_left = 60  # For timed mode
+        self.timed_mode = False
+
+        # Undo feature
+        self.undo_limit = 3
+        self.undo_count = self.undo_limit
+        # Persistent linked lists of Snapshots, (snapshot, rest) or None, newest first.
+        # Pushing never copies, so clones share the whole history.
+        self.history = None
+        self.future = None  # states undone, for redo
+        self.keep_history = True  # False skips snapshots entirely (replays without undo)
+
+        # Features
+        self.chaos_mode = False
+        self.chaos_frequency = 10  # Trigger chaos every X moves
+
+        # Compact mode: plain 4x4 boards move through the bitboard row tables
+        self.use_bitboard = True
+
+        # Special tiles, stored compactly (see clear_specials); special_tiles
+        # gives the {(row, col): {'type': 'bomb', 'turns': 3}} view of them
+        self.special_types = ['bomb', 'swapper', 'frozen']
+        self.special_chance = 0.08  # 8% chance of a special tile
+        self.clear_specials()
+
+        # Missions: the definitions, how many are active at once, and the
+        # counters they are checked against (see MISSION_KINDS)
+        self.missions = list(DEFAULT_MISSIONS if missions is None else missions)
+        for mission in self.missions:
+            if mission["type"] not in MISSION_KINDS:
+                raise ValueError(f"Unknown mission type {mission['type']!r}")
+        self.mission_slots = 1
+        self.combo_count = 0  # merges in the last move
+        self.merge_chain = 0  # moves in a row that merged something
+        self.bomb_kills = 0  # tiles cleared by bombs this game
+        self.chaos_events = 0  # chaos events this game
+        self.assign_missions()
+
+        # Zobrist hash of the position, kept up to date once enable_hashing() is called
+        self.zobrist = None
+        self.hash = 0
+
+        # Optional replay.ReplayWriter logging the player's input
+        self.recorder = None
+
+        # Optional profiler.MoveProfiler timing the phases of step()
+        self.profiler = None
+
+        # Optional events.EventBus told about 2048, chaos, missions, game over and time up
+        self.events = None
+
+        # Initialize grid
+        self.grid = [[0 for _ in range(self.GRID_SIZE)] for _ in range(self.GRID_SIZE)]
+
+        # Kept up to date as cells change (recount() after replacing the grid):
+        # bit i * GRID_SIZE + j of empty_mask is set while cell (i, j) is empty, and
+        # merge_pairs counts adjacent cells with equal values that are not both
+        # frozen, or is None until check_game_over() next needs it. The game is
+        # over when both are zero.
+        self.recount()
+
+    def new_game(self, seed=None):
+        # Same seed, same game for the same moves. Without one, the next seed
+        # comes from the engine's RNG so a session is reproducible from its first seed.
+        if seed is None:
+            seed = self.rng.getrandbits(32)
+        if self.recorder is not None:
+            self.recorder.end_game(self)
+        self.seed = seed
+        self.rng = GameRandom(seed)
+
+        # Reset game variables
+        self.grid = [[0 for _ in range(self.GRID_SIZE)] for _ in range(self.GRID_SIZE)]
+        self.score = 0
+        self.moves = 0
+        self.game_over = False
+        self.game_won = False
+        self.clear_specials()
+        self.combo_count = 0
+        self.merge_chain = 0
+        self.bomb_kills = 0
+        self.chaos_events = 0
+
+        # Reset undo
+        self.history = None
+        self.future = None
+        self.undo_count = self.undo_limit
+
+        # Reset time for timed mode
+        self.time_left = 60
+
+        # Pick random missions
+        self.assign_missions()
+
+        self.rehash()
+        self.recount()
+        if self.recorder is not None:
+            self.recorder.start_game(self)
+
+        # Add initial tiles
+        self.add_new_tile()
+        self.add_new_tile()
+
+    def enable_hashing(self, keys):
+        # Start maintaining self.hash with the given zobrist.ZobristKeys
+        self.zobrist = keys
+        self.rehash()
+
+    def rehash(self):
+        if self.zobrist is not None:
+            self.hash = self.zobrist.full_hash(self.grid, self.special_tiles)
+
+    def recount(self):
+        # Rebuild empty_mask from the grid; merge_pairs is counted again when needed
+        size = self.GRID_SIZE
+        self.neighbor_table = neighbors(size)
+        mask = 0
+        for i, row in enumerate(self.grid):
+            for j, value in enumerate(row):
+                if not value:
+                    mask |= 1 << (i * size + j)
+        self.empty_mask = mask
+        self.merge_pairs = None
+        self.highest_tile = max(map(max, self.grid))
+
+    def count_pairs(self):
+        # Adjacent cells holding the same value, not counting pairs of two frozen tiles
+        grid = self.grid
+        pairs = sum(sum(map(eq, row, row[1:])) for row in grid)
+        pairs += sum(sum(map(eq, upper, lower)) for upper, lower in zip(grid, grid[1:]))
+        frozen = self.special_masks.get('frozen', 0)
+        while frozen:
+            low = frozen & -frozen
+            frozen ^= low
+            idx = low.bit_length() - 1
+            i, j = divmod(idx, self.GRID_SIZE)
+            # Each frozen-frozen pair is seen from both ends
+            for ni, nj in self.neighbor_table[idx]:
+                if (ni, nj) > (i, j) and grid[ni][nj] == grid[i][j] and self.is_frozen((ni, nj)):
+                    pairs -= 1
+        return pairs
+
+    def clear_specials(self):
+        # No special tiles. Each cell has a slot, None or a (type, turns left)
+        # record (turns is -1 for tiles that last until used), and every type
+        # has a bitmask of its cells (bit i * GRID_SIZE + j), so a line's
+        # frozen cells are a shift and a mask away.
+        size = self.GRID_SIZE
+        self.special_slots = [None] * (size * size)
+        self.special_masks = {}  # type -> cells holding that type
+        self.frozen_columns = 0  # frozen cells again, transposed: bit j * GRID_SIZE + i
+        self.special_order = []  # cells holding a special tile, oldest first
+
+    def load_specials(self, specials):
+        # Replace every special tile with (pos, type, turns) records, oldest first.
+        # Leaves hash and merge_pairs for the caller to recompute.
+        self.clear_specials()
+        size = self.GRID_SIZE
+        slots = self.special_slots
+        masks = self.special_masks
+        order = self.special_order
+        for (i, j), special_type, turns in specials:
+            idx = i * size + j
+            slots[idx] = (special_type, turns)
+            masks[special_type] = masks.get(special_type, 0) | 1 << idx
+            order.append(idx)
+            if special_type == 'frozen':
+                self.frozen_columns |= 1 << (j * size + i)
+
+    @property
+    def special_tiles(self):
+        """ {(row, col): {'type': ..., 'turns': ...}}, oldest tile first.
+
+        Built fresh from the compact storage on every access, for views and
+        tools: editing it changes nothing, assigning one replaces every
+        special tile.
+        """
+        size = self.GRID_SIZE
+        slots = self.special_slots
+        return {divmod(idx, size): {'type': slots[idx][0], 'turns': slots[idx][1]}
+                for idx in self.special_order}
+
+    @special_tiles.setter
+    def special_tiles(self, special_tiles):
+        self.load_specials([(pos, info['type'], info['turns']) for pos, info in special_tiles.items()])
+        self.rehash()
+        self.merge_pairs = None
+
+    def is_frozen(self, pos):
+        i, j = pos
+        return self.special_masks.get('frozen', 0) >> (i * self.GRID_SIZE + j) & 1 == 1
+
+    def frozen_row_mask(self, i):
+        # Bit j set when cell (i, j) is frozen
+        size = self.GRID_SIZE
+        return (self.special_masks.get('frozen', 0) >> (i * size)) & ((1 << size) - 1)
+
+    def frozen_column_mask(self, j):
+        # Bit i set when cell (i, j) is frozen
+        size = self.GRID_SIZE
+        return (self.frozen_columns >> (j * size)) & ((1 << size) - 1)
+
+    def set_cell(self, i, j, value):
+        grid = self.grid
+        old = grid[i][j]
+        if old == value:
+            return
+        if self.zobrist is not None:
+            self.hash ^= self.zobrist.value_key(i, j, old) ^ self.zobrist.value_key(i, j, value)
+        grid[i][j] = value
+        highest = self.highest_tile
+        if value > highest:
+            self.highest_tile = value
+        elif old == highest:
+            self.highest_tile = max(map(max, grid))
+
+        size = self.GRID_SIZE
+        if not old or not value:
+            self.empty_mask ^= 1 << (i * size + j)
+        pairs = self.merge_pairs
+        if pairs is not None:
+            # Only the pairs with the four neighbours change; two frozen tiles never count
+            frozen = self.is_frozen((i, j))
+            for ni, nj in self.neighbor_table[i * size + j]:
+                other = grid[ni][nj]
+                if other == value or other == old:
+                    if frozen and self.is_frozen((ni, nj)):
+                        continue
+                    pairs += 1 if other == value else -1
+            self.merge_pairs = pairs
+
+    def set_special(self, pos, special_type, turns=-1):
+        # Put a special tile at pos, or remove the one there when special_type is None.
+        # A tile replacing another keeps its place in special_order.
+        i, j = pos
+        size = self.GRID_SIZE
+        idx = i * size + j
+        old = self.special_slots[idx]
+        if old is None and special_type is None:
+            return
+        old_type = old[0] if old is not None else None
+        if self.zobrist is not None:
+            self.hash ^= (self.zobrist.special_key(pos, *old) if old is not None else 0) ^ \
+                self.zobrist.special_key(pos, special_type, turns)
+        masks = self.special_masks
+        bit = 1 << idx
+        if old is not None:
+            masks[old_type] ^= bit
+        if special_type is not None:
+            masks[special_type] = masks.get(special_type, 0) | bit
+            self.special_slots[idx] = (special_type, turns)
+            if old is None:
+                self.special_order.append(idx)
+        else:
+            self.special_slots[idx] = None
+            self.special_order.remove(idx)
+
+        was_frozen = old_type == 'frozen'
+        if was_frozen != (special_type == 'frozen'):
+            self.frozen_columns ^= 1 << (j * size + i)
+            if self.merge_pairs is not None:
+                # Equal pairs with a frozen neighbour stop (or start) counting
+                value = self.grid[i][j]
+                for ni, nj in self.neighbor_table[idx]:
+                    if self.grid[ni][nj] == value and self.is_frozen((ni, nj)):
+                        self.merge_pairs += 1 if was_frozen else -1
+
+    def write_row(self, i, new_row):
+        # Store row i as rewritten by a move and return the cells whose value
+        # changed. Moves change most pairs at once, so merge_pairs is left to
+        # be counted again when the board fills.
+        row = self.grid[i]
+        size = self.GRID_SIZE
+        if self.zobrist is not None:
+            self.hash_line([(i, j) for j in range(size)], row, new_row)
+        mask = self.empty_mask
+        changed = 0
+        base = i * size
+        for j in range(size):
+            if row[j] != new_row[j]:
+                changed |= 1 << (base + j)
+                if (not row[j]) != (not new_row[j]):
+                    mask ^= 1 << (base + j)
+        self.empty_mask = mask
+        self.merge_pairs = None
+        self.grid[i] = new_row
+        return changed
+
+    def write_column(self, j, new_column):
+        # Same as write_row for column j
+        grid = self.grid
+        size = self.GRID_SIZE
+        if self.zobrist is not None:
+            self.hash_line([(i, j) for i in range(size)], [grid[i][j] for i in range(size)], new_column)
+        mask = self.empty_mask
+        changed = 0
+        for i in range(size):
+            row = grid[i]
+            if row[j] != new_column[i]:
+                changed |= 1 << (i * size + j)
+                if (not row[j]) != (not new_column[i]):
+                    mask ^= 1 << (i * size + j)
+                row[j] = new_column[i]
+        self.empty_mask = mask
+        self.merge_pairs = None
+        return changed
+
+    def hash_line(self, cells, old_line, new_line):
+        # Incremental hash update for a row or column rewritten by a move
+        keys = self.zobrist
+        for (i, j), old, new in zip(cells, old_line, new_line):
+            if old != new:
+                self.hash ^= keys.value_key(i, j, old) ^ keys.value_key(i, j, new)
+
+    def empty_cells(self):
+        # Empty cells in row-major order
+        size = self.GRID_SIZE
+        cells = []
+        mask = self.empty_mask
+        while mask:
+            low = mask & -mask
+            cells.append(divmod(low.bit_length() - 1, size))
+            mask ^= low
+        return cells
+
+    def random_empty_cell(self):
+        # Same draw and same cell as rng.choice(self.empty_cells()), without building the list
+        count = popcount(self.empty_mask)
+        if not count:
+            return None
+        return divmod(nth_bit(self.empty_mask, self.rng.randrange(count)), self.GRID_SIZE)
+
+    def clone(self):
+        # Independent copy of the game state, used for look-ahead
+        other = GameEngine.__new__(GameEngine)
+        other.__dict__.update(self.__dict__)
+        other.grid = [row[:] for row in self.grid]
+        other.special_slots = self.special_slots[:]
+        other.special_masks = dict(self.special_masks)
+        other.special_order = self.special_order[:]
+        other.rng = self.rng.copy()
+        other.recorder = None
+        other.profiler = None
+        other.events = None
+        return other
+
+    def step(self, direction):
+        result = MoveResult(direction)
+        if self.game_over or direction not in DIRECTIONS:
+            return result
+
+        # Optional profiler.MoveProfiler timing each phase; a None test per phase when off
+        profiler = self.profiler
+
+        # State before the move, kept for undo only if something moves
+        before = self.snapshot() if self.keep_history else None
+        if profiler is not None:
+            profiler.mark("save_state")
+
+        score_before = self.score
+        self.combo_count = 0  # Reset combo counter for mission tracking
+        result.moved = self.move(direction)
+        if profiler is not None:
+            profiler.mark("move")
+
+        if result.moved:
+            if before is not None:
+                self.history = (before, self.history)
+                self.future = None
+            if self.recorder is not None:
+                self.recorder.record_move(self, direction)
+
+            # Update moves counter
+            self.moves += 1
+            self.merge_chain = self.merge_chain + 1 if self.combo_count else 0
+
+            # Add new tile
+            self.add_new_tile()
+            if profiler is not None:
+                profiler.mark("spawn")
+
+            # Update turns for time-limited special tiles
+            self.update_special_tiles()
+            if profiler is not None:
+                profiler.mark("special_update")
+
+            # Check for chaos mode
+            if self.chaos_mode and self.moves % self.chaos_frequency == 0:
+                result.chaos_event = self.trigger_chaos_event()
+                if profiler is not None:
+                    profiler.mark("chaos")
+
+            # Check missions
+            self.check_missions()
+            if profiler is not None:
+                profiler.mark("missions")
+
+            # Check game over
+            if self.check_game_over():
+                self.game_over = True
+                result.game_over = True
+                if self.events is not None:
+                    self.events.emit(GameOver(self.score))
+            if profiler is not None:
+                profiler.mark("game_over")
+
+        if self.score > self.high_score:
+            self.high_score = self.score
+
+        result.score_gained = self.score - score_before
+        result.combo = self.combo_count
+        return result
+
+    def move(self, direction):
+        if (self.use_bitboard and self.GRID_SIZE == 4 and not self.special_order
+                and not bitboard.tables_pending()):
+            try:
+                return self.move_bitboard(direction)
+            except ValueError:
+                pass  # Tile too large for a nibble, use the line-by-line rules
+
+        if direction == "Up":
+            return self.move_up()
+        elif direction == "Down":
+            return self.move_down()
+        elif direction == "Left":
+            return self.move_left()
+        elif direction == "Right":
+            return self.move_right()
+        return False
+
+    def move_bitboard(self, direction):
+        # Same result as move_up/down/left/right when there are no special tiles
+        board = bitboard.pack_grid(self.grid)
+        if bitboard.has_max_tile(board):
+            # Two 32768 tiles could merge past what a nibble holds
+            raise ValueError("Board too large for the bitboard tables")
+        new_board, score_gain, merges = bitboard.move_board(board, direction)
+        if new_board == board:
+            return False
+
+        new_grid = bitboard.unpack_board(new_board)
+        if self.zobrist is not None:
+            for i in range(4):
+                self.hash_line([(i, j) for j in range(4)], self.grid[i], new_grid[i])
+        self.grid = new_grid
+        self.empty_mask = bitboard.empty_mask(new_board)
+        self.merge_pairs = None
+        self.score += score_gain
+        self.combo_count += merges
+        if merges:
+            top = max(map(max, new_grid))
+            if top > self.highest_tile:
+                self.highest_tile = top
+
+        # Check for 2048 tile
+        if not self.game_won and bitboard.max_exponent(new_board) >= 11:
+            self.game_won = True
+            if self.events is not None:
+                self.events.emit(TileReached(2048))
+
+        return True
+
+    def slide_paths(self, direction):
+        """ ((row, col), (row, col)) source and destination of every tile for a move.
+
+        Computed on the current grid before the move is made, for views that
+        animate it. Special tile effects that fire during the move are not included.
+        """
+        size = self.GRID_SIZE
+        if direction == "Up":
+            lines = [[(i, j) for i in range(size)] for j in range(size)]
+        elif direction == "Down":
+            lines = [[(i, j) for i in reversed(range(size))] for j in range(size)]
+        elif direction == "Left":
+            lines = [[(i, j) for j in range(size)] for i in range(size)]
+        elif direction == "Right":
+            lines = [[(i, j) for j in reversed(range(size))] for i in range(size)]
+        else:
+            return []
+
+        paths = []
+        for cells in lines:
+            line = [self.grid[i][j] for i, j in cells]
+            frozen_cells = [k for k, pos in enumerate(cells) if self.is_frozen(pos)]
+            paths.extend((cells[src], cells[dst]) for src, dst in line_paths(line, frozen_cells))
+        return paths
+
+    def add_new_tile(self):
+        # Choose random empty cell
+        cell = self.random_empty_cell()
+        if cell is None:
+            return False
+        i, j = cell
+
+        # 90% chance for 2, 10% chance for 4
+        self.set_cell(i, j, 2 if self.rng.random() < 0.9 else 4)
+
+        # Check if we should make it a special tile
+        if self.rng.random() < self.special_chance:
+            special_type = self.rng.choice(self.special_types)
+            # Frozen lasts 3 turns, others until used
+            self.set_special((i, j), special_type, 3 if special_type == 'frozen' else -1)
+
+        return True
+
+    def move_up(self):
+        touched = 0  # cells whose value changed
+        merged_any = False
+        for j in range(self.GRID_SIZE):
+            # Process each column
+            column = [self.grid[i][j] for i in range(self.GRID_SIZE)]
+            frozen = self.frozen_column_mask(j)
+
+            new_column, merged, combo = self.compress_and_merge(column, frozen)
+            self.combo_count += combo
+
+            if column != new_column:
+                # Update grid with new values
+                touched |= self.write_column(j, new_column)
+                merged_any = merged_any or merged
+
+        return self.finish_move(touched, merged_any)
+
+    def move_down(self):
+        touched = 0  # cells whose value changed
+        merged_any = False
+        for j in range(self.GRID_SIZE):
+            # Process each column bottom to top
+            column = [self.grid[i][j] for i in range(self.GRID_SIZE)]
+            frozen = self.frozen_column_mask(j)
+
+            # Reverse, compress, merge, then reverse back
+            column.reverse()
+            frozen = reverse_bits(frozen, self.GRID_SIZE)
+            new_column, merged, combo = self.compress_and_merge(column, frozen)
+            new_column.reverse()
+            self.combo_count += combo
+
+            if column[::-1] != new_column:
+                # Update grid with new values
+                touched |= self.write_column(j, new_column)
+                merged_any = merged_any or merged
+
+        return self.finish_move(touched, merged_any)
+
+    def move_left(self):
+        touched = 0  # cells whose value changed
+        merged_any = False
+        for i in range(self.GRID_SIZE):
+            # Process each row
+            row = self.grid[i].copy()
+            frozen = self.frozen_row_mask(i)
+
+            new_row, merged, combo = self.compress_and_merge(row, frozen)
+            self.combo_count += combo
+
+            if row != new_row:
+                # Update grid with new values
+                touched |= self.write_row(i, new_row)
+                merged_any = merged_any or merged
+
+        return self.finish_move(touched, merged_any)
+
+    def move_right(self):
+        touched = 0  # cells whose value changed
+        merged_any = False
+        for i in range(self.GRID_SIZE):
+            # Process each row right to left
+            row = self.grid[i].copy()
+            frozen = self.frozen_row_mask(i)
+
+            # Reverse, compress, merge, then reverse back
+            row.reverse()
+            frozen = reverse_bits(frozen, self.GRID_SIZE)
+            new_row, merged, combo = self.compress_and_merge(row, frozen)
+            new_row.reverse()
+            self.combo_count += combo
+
+            if row[::-1] != new_row:
+                # Update grid with new values
+                touched |= self.write_row(i, new_row)
+                merged_any = merged_any or merged
+
+        return self.finish_move(touched, merged_any)
+
+    def finish_move(self, touched, merged):
+        # Resolve special tiles once the whole board has moved; True if anything moved
+        if merged and self.special_order:
+            self.apply_special_tile_effects(touched)
+        return touched != 0
+
+    def compress_and_merge(self, line, frozen_mask):
+        # frozen_mask has bit k set when line[k] is frozen
+        if self.use_bitboard and len(line) == 4:
+            entry = bitboard.slide_line(line, frozen_mask)
+            if entry is not None:
+                final_line, score_gain, merges, merged = entry
+                self.score += score_gain
+                if merged:
+                    top = max(final_line)
+                    if top > self.highest_tile:
+                        self.highest_tile = top
+
+                # Check for 2048 tile
+                if merged and not self.game_won and 2048 in final_line:
+                    self.game_won = True
+                    if self.events is not None:
+                        self.events.emit(TileReached(2048))
+
+                return final_line, merged, merges
+
+        frozen_cells = [k for k in range(len(line)) if frozen_mask >> k & 1] if frozen_mask else []
+        final_line, merged_values = merge_line(line, frozen_cells)
+
+        for value in merged_values:
+            self.score += value
+            if value > self.highest_tile:
+                self.highest_tile = value
+
+            # Check for 2048 tile
+            if value == 2048 and not self.game_won:
+                self.game_won = True
+                if self.events is not None:
+                    self.events.emit(TileReached(2048))
+
+        return final_line, bool(merged_values), len(merged_values)
+
+    def apply_special_tile_effects(self, touched=None):
+        # Resolve the special tiles on or next to the touched cells (a bitmask,
+        # None for the whole board), oldest first. Types are as they were on
+        # entry; effects below may clear or move tiles still to come.
+        size = self.GRID_SIZE
+        grid = self.grid
+        slots = self.special_slots
+        if touched is None:
+            specials = [(idx, slots[idx][0]) for idx in self.special_order]
+        else:
+            affected = surrounding_mask(touched, size)
+            specials = [(idx, slots[idx][0]) for idx in self.special_order if affected >> idx & 1]
+
+        for idx, tile_type in specials:
+            i, j = divmod(idx, size)
+
+            # Skip if the cell is now empty (was moved or merged)
+            if grid[i][j] == 0:
+                self.set_special((i, j), None)
+                continue
+
+            # Apply effects based on type
+            if tile_type == 'bomb':
+                # Bomb: clear surrounding tiles
+                for ni in range(max(0, i-1), min(size, i+2)):
+                    for nj in range(max(0, j-1), min(size, j+2)):
+                        if (ni, nj) != (i, j):  # Don't clear the bomb itself
+                            # Add score for cleared tiles
+                            if grid[ni][nj] > 0:
+                                self.score += grid[ni][nj] // 2
+                                self.bomb_kills += 1
+                            self.set_cell(ni, nj, 0)
+                            self.set_special((ni, nj), None)
+
+                # Remove the bomb tile itself after use
+                self.set_special((i, j), None)
+
+            elif tile_type == 'swapper':
+                # Swapper: swap with a random adjacent non-zero tile
+                adjacent = []
+                for ni in range(max(0, i-1), min(size, i+2)):
+                    for nj in range(max(0, j-1), min(size, j+2)):
+                        if (ni, nj) != (i, j) and grid[ni][nj] > 0:
+                            adjacent.append((ni, nj))
+
+                if adjacent:
+                    ni, nj = self.rng.choice(adjacent)
+                    # Swap values
+                    value, other = grid[i][j], grid[ni][nj]
+                    self.set_cell(i, j, other)
+                    self.set_cell(ni, nj, value)
+
+                    # Move special tile status
+                    moved = slots[ni * size + nj]
+                    if moved is not None:
+                        self.set_special((i, j), *moved)
+                        self.set_special((ni, nj), None)
+                    else:
+                        # Remove swapper status after use
+                        self.set_special((i, j), None)
+
+            # Frozen tiles don't have an active effect, they just restrict movement
+
+    def update_special_tiles(self):
+        # Update turn counters for time-limited special tiles
+        size = self.GRID_SIZE
+        slots = self.special_slots
+        expired = []
+
+        for idx in self.special_order:
+            special_type, turns = slots[idx]
+            if turns > 0:
+                if self.zobrist is not None:
+                    pos = divmod(idx, size)
+                    self.hash ^= (self.zobrist.special_key(pos, special_type, turns) ^
+                                  self.zobrist.special_key(pos, special_type, turns - 1))
+                slots[idx] = (special_type, turns - 1)
+                if turns <= 1:
+                    expired.append(idx)
+
+        # Remove expired special tiles
+        for idx in expired:
+            self.set_special(divmod(idx, size), None)
+
+    def check_game_over(self):
+        # No empty cell and no adjacent equal pair where either tile can move
+        if self.empty_mask:
+            return False
+        if self.merge_pairs is None:
+            self.merge_pairs = self.count_pairs()
+        return not self.merge_pairs
+
+    def snapshot(self):
+        # Immutable copy of the state undo restores
+        specials = ()
+        if self.special_order:
+            size = self.GRID_SIZE
+            slots = self.special_slots
+            specials = tuple((divmod(idx, size),) + slots[idx] for idx in self.special_order)
+        return Snapshot(pack_board(self.grid), self.score, specials,
+                        (self.active_missions, self.mission_baselines,
+                         self.merge_chain, self.bomb_kills, self.chaos_events),
+                        self.rng.getstate(), (self.empty_mask, self.merge_pairs, self.highest_tile))
+
+    def restore(self, snapshot):
+        self.grid = unpack_board(snapshot.board, self.GRID_SIZE)
+        self.score = snapshot.score
+        self.load_specials(snapshot.specials)
+        active, baselines, self.merge_chain, self.bomb_kills, self.chaos_events = snapshot.mission
+        if active != self.active_missions or baselines != self.mission_baselines:
+            self.active_missions = active
+            self.mission_baselines = baselines
+            self.update_mission_targets()
+        # Rewind the RNG too, so replaying the undone move spawns the same tile
+        self.rng.setstate(snapshot.rng)
+        self.rehash()
+        if snapshot.counters is None:
+            self.recount()
+        else:
+            self.empty_mask, self.merge_pairs, self.highest_tile = snapshot.counters
+
+    def save_state(self):
+        # Push the current state onto the undo history
+        self.history = (self.snapshot(), self.history)
+        self.future = None
+
+    def undo_move(self):
+        if self.history is None or self.undo_count <= 0:
+            return False
+
+        # Restore previous state, keeping the current one for redo
+        snapshot, self.history = self.history
+        self.future = (self.snapshot(), self.future)
+        self.restore(snapshot)
+
+        # Decrement undo count
+        self.undo_count -= 1
+        if self.recorder is not None:
+            self.recorder.record_undo()
+        return True
+
+    def redo_move(self):
+        # Take back an undo, which also gives the undo back
+        if self.future is None:
+            return False
+
+        snapshot, self.future = self.future
+        self.history = (self.snapshot(), self.history)
+        self.restore(snapshot)
+        self.undo_count += 1
+        if self.recorder is not None:
+            self.recorder.record_redo()
+        return True
+
+    def history_length(self):
+        length = 0
+        node = self.history
+        while node is not None:
+            length += 1
+            node = node[1]
+        return length
+
+    def tick_timer(self):
+        # Advance the timed-mode clock by one second, returns True when time runs out
+        if self.time_left > 0:
+            self.time_left -= 1
+            return False
+
+        self.game_over = True
+        if self.recorder is not None:
+            self.recorder.record_time_up()
+        if self.events is not None:
+            self.events.emit(TimeUp(self.score))
+        return True
+
+    def trigger_chaos_event(self):
+        # Pick a random chaos event
+        event_type = self.rng.choice([
+            "shuffle_one_row",
+            "shuffle_one_column",
+            "add_extra_tile",
+            "add_special_tile"
+        ])
+
+        if event_type == "shuffle_one_row":
+            # Shuffle a random row
+            row = self.rng.randint(0, self.GRID_SIZE-1)
+            values = [self.grid[row][j] for j in range(self.GRID_SIZE) if self.grid[row][j] != 0]
+            self.rng.shuffle(values)
+
+            # Place shuffled values back
+            idx = 0
+            for j in range(self.GRID_SIZE):
+                if self.grid[row][j] != 0:
+                    self.set_cell(row, j, values[idx])
+                    idx += 1
+
+        elif event_type == "shuffle_one_column":
+            # Shuffle a random column
+            col = self.rng.randint(0, self.GRID_SIZE-1)
+            values = [self.grid[i][col] for i in range(self.GRID_SIZE) if self.grid[i][col] != 0]
+            self.rng.shuffle(values)
+
+            # Place shuffled values back
+            idx = 0
+            for i in range(self.GRID_SIZE):
+                if self.grid[i][col] != 0:
+                    self.set_cell(i, col, values[idx])
+                    idx += 1
+
+        elif event_type == "add_extra_tile":
+            # Add an extra tile
+            self.add_new_tile()
+
+        elif event_type == "add_special_tile":
+            # Find empty spot and add a special tile
+            cell = self.random_empty_cell()
+            if cell is not None:
+                i, j = cell
+                self.set_cell(i, j, 2)
+                special_type = self.rng.choice(self.special_types)
+                self.set_special((i, j), special_type, 3 if special_type == 'frozen' else -1)
+
+        self.chaos_events += 1
+
+        # Chaos mode notification
+        if self.events is not None:
+            self.events.emit(ChaosTriggered(event_type))
+        return event_type
+
+    @property
+    def current_mission(self):
+        # The mission in the first slot, the one the window lists first
+        return self.missions[self.active_missions[0]]
+
+    def assign_missions(self):
+        # Fill the mission slots at random, for a new game. active_missions
+        # (indexes into missions) and mission_baselines are tuples, shared by
+        # clones and snapshots and replaced whenever a mission changes.
+        self.active_missions = ()
+        self.mission_baselines = ()
+        for _ in range(min(self.mission_slots, len(self.missions))):
+            index = self.pick_mission()
+            self.active_missions += (index,)
+            self.mission_baselines += (self.mission_baseline(index),)
+        self.update_mission_targets()
+
+    def pick_mission(self):
+        # Index of a random mission that isn't active (a completed one repeats if none is left)
+        active = self.active_missions
+        available = [k for k in range(len(self.missions)) if k not in active]
+        return self.rng.choice(available or list(active))
+
+    def mission_baseline(self, index):
+        # Counter value progress is measured from, for a mission assigned now
+        kind = MISSION_KINDS[self.missions[index]["type"]]
+        return getattr(self, kind["counter"]) if kind.get("since_assigned") else 0
+
+    def mission_progress(self, slot=0):
+        mission = self.missions[self.active_missions[slot]]
+        return getattr(self, MISSION_KINDS[mission["type"]]["counter"]) - self.mission_baselines[slot]
+
+    def update_mission_targets(self):
+        # counter -> smallest value of it that completes an active mission, so a
+        # move checks each counter once however many missions are active
+        targets = {}
+        for index, baseline in zip(self.active_missions, self.mission_baselines):
+            mission = self.missions[index]
+            counter = MISSION_KINDS[mission["type"]]["counter"]
+            target = mission["goal_value"] + baseline
+            if counter not in targets or target < targets[counter]:
+                targets[counter] = target
+        self.mission_targets = targets
+
+    def check_missions(self):
+        for counter, target in self.mission_targets.items():
+            if getattr(self, counter) >= target:
+                break
+        else:
+            return
+
+        # Some mission is done; complete every one that is, in slot order
+        done = [slot for slot, index in enumerate(self.active_missions)
+                if self.mission_progress(slot) >= self.missions[index]["goal_value"]]
+        for slot in done:
+            self.complete_mission(slot)
+        self.update_mission_targets()
+
+    def complete_mission(self, slot=0):
+        mission = self.missions[self.active_missions[slot]]
+        reward_text = self.grant_reward(mission)
+
+        # Completion notice
+        if self.events is not None:
+            self.events.emit(MissionCompleted(mission["type"], mission["description"], reward_text))
+
+        # Set new mission
+        index = self.pick_mission()
+        self.active_missions = self.active_missions[:slot] + (index,) + self.active_missions[slot + 1:]
+        self.mission_baselines = (self.mission_baselines[:slot] + (self.mission_baseline(index),) +
+                                  self.mission_baselines[slot + 1:])
+
+    def grant_reward(self, mission):
+        # Apply a completed mission's reward, returns its description
+        reward = mission.get("reward")
+        if reward == "undo":
+            # Reward: Extra undo
+            amount = mission.get("reward_amount", 1)
+            self.undo_count = min(self.undo_count + amount, 5)
+            return f"Reward: +{amount} Undo!"
+
+        elif reward == "bomb":
+            # Reward: Bomb tile
+            cell = self.random_empty_cell()
+            if cell is not None:
+                i, j = cell
+                self.set_cell(i, j, 2)
+                self.set_special((i, j), 'bomb')
+            return "Reward: Bomb tile added!"
+
+        elif reward == "points":
+            # Reward: Extra points
+            bonus = mission.get("reward_amount", mission["goal_value"] // 5)
+            self.score += bonus
+            return f"Reward: +{bonus} points!"
+
+        return ""
+
+    def get_highest_tile(self):
+        return self.highest_tile
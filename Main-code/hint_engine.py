@@ -0,0 +1,521 @@
+""" Expectimax search used for hints.
+
+The search runs on copies of a GameEngine, so it never touches the live game
+or the UI. Max nodes try the four moves; chance nodes spawn a tile in every
+empty cell with the same odds as GameEngine.add_new_tile (90% a 2, 10% a 4,
+special_chance of it being a special tile). Chance outcomes whose
+probability of being reached drops below min_probability are pruned, and
+iterative deepening stops at the time budget, keeping the deepest search
+that finished.
+
+Chance node values are cached in a TranspositionTable keyed by the engine's
+incremental Zobrist hash, so positions reached through different move
+orders, or already searched for the previous hint, are not searched again.
+
+BackgroundHintSearch runs the search in a thread and publishes the best
+move after every completed depth. ParallelHintSearch spreads it over a
+process pool instead: every legal first move's chance node is split into
+groups of spawn cells, each searched by iterative deepening in a worker
+for the time budget, counted from when the worker picks the group up (so
+spawning workers doesn't use it up). Both hand back jobs with the same poll/done/cancel
+interface so the UI can show the best move so far without blocking.
+"""
+
+import os
+import time
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from game_engine import DIRECTIONS
+from zobrist import ZobristKeys
+
+# Heuristic weights for a single row or column, on log2 tile values
+LOST_PENALTY = 200000.0
+MONOTONICITY_POWER = 4.0
+MONOTONICITY_WEIGHT = 47.0
+SUM_POWER = 3.5
+SUM_WEIGHT = 11.0
+MERGES_WEIGHT = 700.0
+EMPTY_WEIGHT = 270.0
+
+_line_scores = {}
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class TranspositionTable:
+    """ Bounded position cache with depth-aware replacement and LRU eviction.
+
+    An entry answers a lookup when it was searched at least as deep as
+    requested. A shallower result never overwrites a deeper one, and the
+    least recently used entry is evicted once capacity is reached.
+    """
+
+    def __init__(self, capacity=200000):
+        self.capacity = capacity
+        self._entries = OrderedDict()  # hash -> (depth, value)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, key, depth):
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] >= depth:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, value):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            if entry[0] > depth:
+                return  # keep the deeper result
+        self._entries[key] = (depth, value)
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+class Hint:
+    """ Result of a hint search. """
+
+    def __init__(self, direction, value, depth, nodes, scores):
+        self.direction = direction  # None when no move is possible
+        self.value = value
+        self.depth = depth  # deepest fully searched depth
+        self.nodes = nodes
+        self.scores = scores  # direction -> expected value at that depth
+        self.table_hits = 0
+        self.table_misses = 0
+
+    def __repr__(self):
+        return f"Hint(direction={self.direction!r}, depth={self.depth}, nodes={self.nodes})"
+
+
+def line_score(line):
+    # Heuristic for one row or column, cached per distinct line
+    key = tuple(line)
+    score = _line_scores.get(key)
+    if score is not None:
+        return score
+
+    ranks = [value.bit_length() - 1 if value else 0 for value in line]
+    empty = ranks.count(0)
+    total = sum(rank ** SUM_POWER for rank in ranks)
+
+    merges = 0
+    prev = 0
+    counter = 0
+    for rank in ranks:
+        if rank == 0:
+            continue
+        if rank == prev:
+            counter += 1
+        elif counter > 0:
+            merges += 1 + counter
+            counter = 0
+        prev = rank
+    if counter > 0:
+        merges += 1 + counter
+
+    mono_left = 0.0
+    mono_right = 0.0
+    for a, b in zip(ranks, ranks[1:]):
+        if a > b:
+            mono_left += a ** MONOTONICITY_POWER - b ** MONOTONICITY_POWER
+        else:
+            mono_right += b ** MONOTONICITY_POWER - a ** MONOTONICITY_POWER
+
+    score = (LOST_PENALTY + EMPTY_WEIGHT * empty + MERGES_WEIGHT * merges
+             - MONOTONICITY_WEIGHT * min(mono_left, mono_right) - SUM_WEIGHT * total)
+    _line_scores[key] = score
+    return score
+
+
+def evaluate(grid):
+    # Board heuristic: every row plus every column
+    value = 0.0
+    for row in grid:
+        value += line_score(row)
+    for column in zip(*grid):
+        value += line_score(column)
+    return value
+
+
+class HintEngine:
+    """ Depth-limited expectimax over copies of a GameEngine. """
+
+    def __init__(self, max_depth=3, time_budget=0.1, min_probability=0.0001, table_size=200000):
+        self.max_depth = max_depth
+        self.time_budget = time_budget  # seconds
+        self.min_probability = min_probability
+        self.table = TranspositionTable(table_size)
+        self.nodes = 0
+        self.should_stop = None  # optional callable, checked with the deadline
+        self._keys = {}  # grid size -> ZobristKeys
+        self._deadline = None
+
+    def prepare(self, engine):
+        # Hashed copy of the engine for searching, without undo history
+        state = engine.clone()
+        state.history = state.future = None
+        keys = self._keys.get(state.GRID_SIZE)
+        if keys is None:
+            keys = self._keys[state.GRID_SIZE] = ZobristKeys(state.GRID_SIZE)
+        state.enable_hashing(keys)
+        return state
+
+    def search(self, engine):
+        best = Hint(None, 0.0, 0, 0, {})
+        for best in self.iter_search(engine):
+            pass
+        return best
+
+    def iter_search(self, engine):
+        # Iterative deepening, yields a Hint after every depth that finished
+        state = self.prepare(engine)
+        self.nodes = 0
+        hits, misses = self.table.hits, self.table.misses
+        self._deadline = time.perf_counter() + self.time_budget
+
+        for depth in range(1, self.max_depth + 1):
+            try:
+                scores = self.root_scores(state, depth)
+            except SearchTimeout:
+                return
+            if not scores:
+                return
+            direction = max(scores, key=scores.get)
+            hint = Hint(direction, scores[direction], depth, self.nodes, scores)
+            hint.table_hits = self.table.hits - hits
+            hint.table_misses = self.table.misses - misses
+            yield hint
+
+    def root_scores(self, state, depth):
+        scores = {}
+        for direction in DIRECTIONS:
+            child = state.clone()
+            if child.move(direction):
+                scores[direction] = self.chance_value(child, depth, 1.0)
+        return scores
+
+    def max_value(self, state, depth, probability):
+        best = 0.0  # no legal move: the game is lost
+        for direction in DIRECTIONS:
+            child = state.clone()
+            if child.move(direction):
+                best = max(best, self.chance_value(child, depth, probability))
+        return best
+
+    def chance_value(self, state, depth, probability):
+        self.nodes += 1
+        grid = state.grid
+        if depth <= 1:
+            return evaluate(grid)  # before the deadline check, so depth 1 always finishes
+        self.check_deadline()
+
+        cached = self.table.lookup(state.hash, depth)
+        if cached is not None:
+            return cached
+
+        empty_cells = self.empty_cells(state)
+        if not empty_cells:
+            return evaluate(grid)
+
+        total, weight = self.chance_sum(state, empty_cells, len(empty_cells), depth, probability)
+        if weight == 0.0:
+            return evaluate(grid)
+        value = total / weight
+        self.table.store(state.hash, depth, value)
+        return value
+
+    def check_deadline(self):
+        if time.perf_counter() > self._deadline or (self.should_stop and self.should_stop()):
+            raise SearchTimeout()
+
+    def empty_cells(self, state):
+        return state.empty_cells()
+
+    def chance_sum(self, state, cells, empty_count, depth, probability):
+        # Weighted sum over spawns in the given cells, returns (total, weight)
+        outcomes = self.spawn_outcomes(state, empty_count)
+        total = 0.0
+        weight = 0.0
+        for i, j in cells:
+            # Big boards have hundreds of spawn cells per node, so check between them too
+            self.check_deadline()
+            for value, special_type, p in outcomes:
+                reach = probability * p
+                if reach < self.min_probability:
+                    continue  # too unlikely to be worth searching
+                child = state.clone()
+                child.set_cell(i, j, value)
+                if special_type:
+                    child.set_special((i, j), special_type, 3 if special_type == 'frozen' else -1)
+                child.update_special_tiles()
+                total += p * self.max_value(child, depth - 1, reach)
+                weight += p
+        return total, weight
+
+    def spawn_outcomes(self, state, empty_count):
+        # (value, special type or None, probability) for one empty cell
+        special_chance = state.special_chance
+        types = state.special_types
+        outcomes = []
+        for value, p_value in ((2, 0.9), (4, 0.1)):
+            p = p_value / empty_count
+            outcomes.append((value, None, p * (1 - special_chance)))
+            for special_type in types:
+                outcomes.append((value, special_type, p * special_chance / len(types)))
+        return outcomes
+
+
+# Per-process state of pool workers
+_worker_engine = None
+_worker_generation = None
+
+
+def _init_worker(generation):
+    global _worker_engine, _worker_generation
+    import bitboard
+    bitboard.row_tables()  # load or build the move tables once per worker, before any search
+    _worker_engine = HintEngine(max_depth=1)
+    _worker_generation = generation
+
+
+def _worker_ready():
+    # No-op task that makes the pool start a worker (see ParallelHintSearch.warm_up)
+    return True
+
+
+def _search_subtree(state, cells, empty_count, generation, time_budget, max_depth, min_probability):
+    """ Worker: iterative deepening over spawns in `cells` of one first move's chance node.
+
+    The time budget starts when the worker gets here, not when the hint was requested.
+    Returns {depth: (total, weight)} for each depth that finished, and the node count.
+    """
+    engine = _worker_engine
+    engine.min_probability = min_probability
+    engine.nodes = 0
+    engine.should_stop = lambda: _worker_generation.value != generation
+    engine._deadline = time.perf_counter() + time_budget
+
+    state = engine.prepare(state)
+    results = {}
+    for depth in range(2, max_depth + 1):
+        try:
+            results[depth] = engine.chance_sum(state, cells, empty_count, depth, 1.0)
+        except SearchTimeout:
+            break
+    return results, engine.nodes
+
+
+class BackgroundHintJob:
+    """ A hint being searched in a background thread. Poll it from the UI loop. """
+
+    def __init__(self, hint_engine, engine):
+        self.moves = engine.moves  # the board this hint is for
+        self.cancelled = False
+        self._hint_engine = hint_engine
+        self._state = engine.clone()
+        self._best = None
+        self._finished = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        try:
+            for hint in self._hint_engine.iter_search(self._state):
+                self._best = hint
+        finally:
+            self._finished = True
+
+    def done(self):
+        return self._finished
+
+    def poll(self):
+        # Best Hint found so far, None before depth 1 finished or once cancelled
+        return None if self.cancelled else self._best
+
+    def cancel(self):
+        self.cancelled = True
+        self._thread.join()
+
+
+class BackgroundHintSearch:
+    """ Single-threaded iterative deepening that never blocks the caller. """
+
+    def __init__(self, max_depth=6, time_budget=1.0, min_probability=0.0001):
+        self.hint_engine = HintEngine(max_depth, time_budget, min_probability)
+        self._job = None
+
+    def start(self, engine):
+        # Only one search runs at a time; a newer request replaces the old one
+        if self._job is not None and not self._job.done():
+            self._job.cancel()
+        job = BackgroundHintJob(self.hint_engine, engine)
+        self.hint_engine.should_stop = lambda: job.cancelled
+        job._thread.start()
+        self._job = job
+        return job
+
+    def shutdown(self):
+        if self._job is not None:
+            self._job.cancel()
+
+
+class HintJob:
+    """ A hint being searched in the pool. Poll it from the UI loop. """
+
+    def __init__(self, search, generation, fallback, tasks, moves):
+        self._search = search
+        self.generation = generation
+        self.fallback = fallback  # depth-1 Hint computed up front
+        self.tasks = tasks  # [(direction, future)]
+        self.moves = moves  # the board this hint is for
+        self.cancelled = False
+
+    def done(self):
+        return all(future.done() for _, future in self.tasks)
+
+    def poll(self):
+        # Depth-1 fallback until every worker finished, then the combined Hint
+        if self.cancelled:
+            return None
+        if not self.done():
+            return self.fallback
+        return self.result()
+
+    def cancel(self):
+        # Stop the workers still searching this job (e.g. the player moved first)
+        if not self.cancelled:
+            self.cancelled = True
+            for _, future in self.tasks:
+                future.cancel()
+            self._search.cancel(self.generation)
+
+    def result(self):
+        per_direction = {}
+        nodes = self.fallback.nodes
+        for direction, future in self.tasks:
+            if future.cancelled() or future.exception() is not None:
+                return self.fallback
+            results, task_nodes = future.result()
+            nodes += task_nodes
+            per_direction.setdefault(direction, []).append(results)
+
+        # Deepest depth every task of every move finished
+        depth = min((max(results, default=1) for parts in per_direction.values() for results in parts),
+                    default=1)
+        if depth < 2:
+            self.fallback.nodes = nodes
+            return self.fallback
+
+        scores = {}
+        for direction, parts in per_direction.items():
+            total = sum(results[depth][0] for results in parts)
+            weight = sum(results[depth][1] for results in parts)
+            scores[direction] = total / weight if weight else self.fallback.scores[direction]
+        direction = max(scores, key=scores.get)
+        return Hint(direction, scores[direction], depth, nodes, scores)
+
+
+class ParallelHintSearch:
+    """ Root-parallel hint search over a process pool.
+
+    start() returns a HintJob right away; the UI polls it (e.g. with
+    master.after) and cancels it if the player moves before it finishes.
+    Workers never import Tkinter or build a window.
+    """
+
+    def __init__(self, workers=None, max_depth=6, time_budget=0.1, min_probability=0.0001):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_depth = max_depth
+        self.time_budget = time_budget
+        self.min_probability = min_probability
+        self._local = HintEngine(max_depth=1)
+        self._context = multiprocessing.get_context("spawn")
+        self._generation = None
+        self._pool = None
+
+    def _ensure_pool(self):
+        if self._pool is None:
+            # A new pool carries the generation on, so cancelling an old job can't stop a new one
+            generation = self._generation.value if self._generation is not None else 0
+            self._generation = self._context.RawValue('i', generation)
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=self._context,
+                                             initializer=_init_worker, initargs=(self._generation,))
+        return self._pool
+
+    def warm_up(self):
+        # Start every worker now: spawning one and building its move tables can take
+        # seconds, which would otherwise hold up the first hint
+        pool = self._ensure_pool()
+        for _ in range(self.workers):
+            pool.submit(_worker_ready)
+
+    def start(self, engine):
+        pool = self._ensure_pool()
+        self._generation.value += 1
+        generation = self._generation.value
+
+        fallback = self._local.search(engine)
+        state = engine.clone()
+        state.history = state.future = None
+
+        # Split each first move's spawn cells so there is about one task per worker
+        moves = []
+        for direction in DIRECTIONS:
+            child = state.clone()
+            if child.move(direction):
+                moves.append((direction, child))
+
+        tasks = []
+        if moves and self.max_depth >= 2:
+            chunks_per_move = max(1, self.workers // len(moves))
+            try:
+                for direction, child in moves:
+                    child.zobrist = None  # workers hash with their own keys
+                    cells = self._local.empty_cells(child)
+                    if not cells:
+                        continue
+                    chunk = -(-len(cells) // chunks_per_move)
+                    for start in range(0, len(cells), chunk):
+                        future = pool.submit(_search_subtree, child, cells[start:start + chunk], len(cells),
+                                             generation, self.time_budget, self.max_depth,
+                                             self.min_probability)
+                        tasks.append((direction, future))
+            except BrokenProcessPool:
+                # A worker died: this hint gets the depth-1 fallback, the next one a fresh pool
+                for _, future in tasks:
+                    future.cancel()
+                tasks = []
+                self.shutdown()
+                self.warm_up()
+
+        return HintJob(self, generation, fallback, tasks, engine.moves)
+
+    def cancel(self, generation):
+        if self._generation is not None and self._generation.value == generation:
+            self._generation.value += 1
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
@@ -0,0 +1,146 @@
+""" Per-phase timing of moves, for tracking down lag.
+
+A MoveProfiler is handed to GameEngine.profiler (and used by the window's
+input queue). Each move is split into phases by calling mark(phase) at
+the end of every phase; the time since the previous mark is charged to
+that phase. end() files the move into one RollingHistogram per phase,
+which only remembers the last `window` samples, so the numbers follow
+what the player is seeing now rather than the whole session.
+
+The window repaints once per frame however many moves were played in it,
+so the render and toasts phases are filed per frame with add().
+
+When no profiler is attached the engine and window only pay an
+`is not None` test per phase.
+"""
+
+import csv
+import json
+import time
+from collections import deque
+
+# Phases of a key press, in the order they happen
+PHASES = ["input", "save_state", "move", "spawn", "special_update", "chaos", "missions",
+          "game_over", "render", "toasts"]
+
+# Histogram buckets: upper bounds in microseconds, doubling from 1us to about 1s
+BUCKET_BOUNDS_US = [1 << k for k in range(21)]
+LAST_BUCKET = len(BUCKET_BOUNDS_US) - 1
+
+
+def bucket_index(ns):
+    # First bucket whose bound is >= ns; the last bucket also takes anything slower
+    return min(LAST_BUCKET, ((ns - 1) // 1000).bit_length()) if ns > 0 else 0
+
+
+class RollingHistogram:
+    """ Log-scale histogram and percentiles of the last `window` samples (nanoseconds). """
+
+    def __init__(self, window=1000):
+        self.samples = deque()
+        self.window = window
+        self.buckets = [0] * len(BUCKET_BOUNDS_US)
+        self.total = 0  # samples ever added
+
+    def add(self, ns):
+        samples = self.samples
+        if len(samples) == self.window:
+            self.buckets[bucket_index(samples.popleft())] -= 1
+        samples.append(ns)
+        self.buckets[bucket_index(ns)] += 1
+        self.total += 1
+
+    def __len__(self):
+        return len(self.samples)
+
+    def summary(self):
+        # count, mean and percentiles in microseconds over the window
+        ordered = sorted(self.samples)
+        count = len(ordered)
+        if not count:
+            return {"count": 0, "total": self.total}
+
+        def pct(p):
+            return ordered[max(1, -(-p * count // 100)) - 1] / 1000
+
+        return {
+            "count": count,
+            "total": self.total,
+            "mean_us": sum(ordered) / count / 1000,
+            "p50_us": pct(50),
+            "p90_us": pct(90),
+            "p99_us": pct(99),
+            "max_us": ordered[-1] / 1000,
+        }
+
+
+class MoveProfiler:
+    def __init__(self, window=1000):
+        self.window = window
+        self.histograms = {phase: RollingHistogram(window) for phase in PHASES + ["total"]}
+        self.clock = time.perf_counter_ns
+        self.current = {}
+        self.start = self.last = None
+
+    def begin(self):
+        self.current = {}
+        self.start = self.last = self.clock()
+
+    def mark(self, phase):
+        # Charge the time since the previous mark to phase
+        if self.last is None:
+            return
+        now = self.clock()
+        self.current[phase] = self.current.get(phase, 0) + now - self.last
+        self.last = now
+
+    def end(self):
+        if self.start is None:
+            return
+        histograms = self.histograms
+        for phase, ns in self.current.items():
+            histograms[phase].add(ns)
+        histograms["total"].add(self.clock() - self.start)
+        self.current = {}
+        self.start = self.last = None
+
+    def add(self, phase, ns):
+        # File a phase timed on its own rather than as part of a move
+        self.histograms[phase].add(ns)
+
+    def reset(self):
+        self.histograms = {phase: RollingHistogram(self.window) for phase in PHASES + ["total"]}
+
+    def summary(self):
+        return {phase: histogram.summary() for phase, histogram in self.histograms.items()}
+
+    def format_table(self):
+        # Text for the debug overlay, milliseconds
+        lines = [f"{'phase':<15}{'p50':>7}{'p90':>7}{'p99':>7}{'max':>7}"]
+        for phase, stats in self.summary().items():
+            if not stats["count"]:
+                continue
+            lines.append(f"{phase:<15}" + "".join(f"{stats[key] / 1000:>7.2f}"
+                                                  for key in ("p50_us", "p90_us", "p99_us", "max_us")))
+        lines.append(f"ms over the last {len(self.histograms['total'])} key presses")
+        return "\n".join(lines)
+
+    def dump_json(self, path):
+        data = {
+            "window": self.window,
+            "bucket_bounds_us": BUCKET_BOUNDS_US,
+            "phases": {phase: dict(histogram.summary(), buckets=list(histogram.buckets))
+                       for phase, histogram in self.histograms.items()},
+        }
+        with open(path, "w") as f:
+            json.dump(data, f, indent=2)
+
+    def dump_csv(self, path):
+        # One row per phase: summary stats, then the bucket counts
+        fields = ["count", "total", "mean_us", "p50_us", "p90_us", "p99_us", "max_us"]
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["phase"] + fields + [f"le_{bound}us" for bound in BUCKET_BOUNDS_US])
+            for phase, histogram in self.histograms.items():
+                stats = histogram.summary()
+                writer.writerow([phase] + [stats.get(field, "") for field in fields] + histogram.buckets)
@@ -0,0 +1,300 @@
+""" Compact binary replay logs.
+
+A game is a pure function of its seed and the moves played (undo rewinds
+the RNG), so a log only stores the seed, the rule settings and the player's
+input. Spawns, swaps, chaos events and mission rewards are re-derived by
+running the log through GameEngine.
+
+File layout: games are appended one after another. Each starts with a
+fixed header (HEADER struct: magic, version, grid size, chaos frequency,
+undo limit, special chance, seed) followed by one byte per event group:
+
+    tag 01/10/11 in the top two bits: 1-3 moves, 2 bits each from bit 0 up,
+                                      in game_engine.DIRECTIONS order
+    tag 00: a control op in the low six bits (UNDO, REDO, CHAOS_ON,
+            CHAOS_OFF, TIME_UP), or END followed by the final score and
+            move count (END_STRUCT) so replays can be verified
+
+The version goes up whenever the rules change in a way that would replay
+old games differently (version 2: special tiles resolve once per move
+instead of once per merging line). Older games still parse, but verify
+skips them, like games that never ended.
+
+Moves cost 2.7 bits each. ReplayWriter appends to the file as the game is
+played and flushes every complete byte, so a crash loses at most two
+moves; a game without END (window closed mid-game) still replays.
+
+    python replay.py verify replays.bin
+    python replay.py show replays.bin --game 3 --move 120
+"""
+
+import os
+import sys
+import time
+import struct
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from game_engine import GameEngine, DIRECTIONS
+
+REPLAY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "replays.bin")
+
+MAGIC = b"R48"
+VERSION = 2
+HEADER = struct.Struct("<3sBBBBdQ")
+END_STRUCT = struct.Struct("<QI")
+
+# Control ops (tag 00)
+UNDO, REDO, CHAOS_ON, CHAOS_OFF, TIME_UP, END = range(1, 7)
+OP_NAMES = {UNDO: "undo", REDO: "redo", CHAOS_ON: "chaos on", CHAOS_OFF: "chaos off",
+            TIME_UP: "time up", END: "end"}
+
+_DIRECTION_CODES = {direction: code for code, direction in enumerate(DIRECTIONS)}
+
+
+class ReplayWriter:
+    """ Appends the games an engine plays to a replay file.
+
+    Attach it with engine.recorder = writer before new_game(); the engine
+    reports games, moves, undos and timeouts itself. Call close(engine)
+    when done so the last game gets its END record.
+    """
+
+    def __init__(self, path=REPLAY_PATH):
+        self.path = path
+        self.file = open(path, "ab")
+        self.pending = []  # direction codes not yet written, at most two
+        self.in_game = False
+        self.chaos_mode = False
+
+    def start_game(self, engine):
+        if self.in_game:
+            self.end_game(engine)
+        self.file.write(HEADER.pack(MAGIC, VERSION, engine.GRID_SIZE, engine.chaos_frequency,
+                                    engine.undo_limit, engine.special_chance, engine.seed & (2 ** 64 - 1)))
+        self.in_game = True
+        self.chaos_mode = False
+        if engine.chaos_mode:
+            self.record(CHAOS_ON)
+        self.file.flush()
+
+    def record_move(self, engine, direction):
+        if engine.chaos_mode != self.chaos_mode:
+            # Chaos mode can be toggled at any time; it only matters when a move is made
+            self.record(CHAOS_ON if engine.chaos_mode else CHAOS_OFF)
+        self.pending.append(_DIRECTION_CODES[direction])
+        if len(self.pending) == 3:
+            self.flush_moves()
+            self.file.flush()
+
+    def flush_moves(self):
+        if not self.pending:
+            return
+        byte = len(self.pending) << 6
+        for k, code in enumerate(self.pending):
+            byte |= code << (2 * k)
+        self.file.write(bytes((byte,)))
+        self.pending = []
+
+    def record(self, op):
+        if not self.in_game:
+            return
+        self.flush_moves()
+        self.file.write(bytes((op,)))
+        if op == CHAOS_ON:
+            self.chaos_mode = True
+        elif op == CHAOS_OFF:
+            self.chaos_mode = False
+        self.file.flush()
+
+    def record_undo(self):
+        self.record(UNDO)
+
+    def record_redo(self):
+        self.record(REDO)
+
+    def record_time_up(self):
+        self.record(TIME_UP)
+
+    def end_game(self, engine):
+        if not self.in_game:
+            return
+        self.record(END)
+        self.file.write(END_STRUCT.pack(engine.score, engine.moves))
+        self.file.flush()
+        self.in_game = False
+
+    def close(self, engine=None):
+        if engine is not None:
+            self.end_game(engine)
+        else:
+            self.flush_moves()
+        self.file.close()
+
+
+class GameRecord:
+    """ One game read back from a log. events holds direction codes 0-3 and control ops as -op. """
+
+    def __init__(self, grid_size, chaos_frequency, undo_limit, special_chance, seed, version=VERSION):
+        self.version = version  # rules the game was played under
+        self.grid_size = grid_size
+        self.chaos_frequency = chaos_frequency
+        self.undo_limit = undo_limit
+        self.special_chance = special_chance
+        self.seed = seed
+        self.events = []
+        self.final_score = None  # None when the log ends mid-game
+        self.final_moves = None
+
+    @property
+    def moves(self):
+        return sum(1 for event in self.events if event >= 0)
+
+    def __repr__(self):
+        return (f"GameRecord(seed={self.seed}, grid_size={self.grid_size}, moves={self.moves}, "
+                f"final_score={self.final_score})")
+
+
+def parse_game(data, pos=0):
+    """ Decode the game starting at byte pos of data (bytes or an mmap).
+
+    Returns (record, end), end being the position just past the game.
+    """
+    size = len(data)
+    magic, version, grid_size, chaos_frequency, undo_limit, special_chance, seed = \
+        HEADER.unpack_from(data, pos)
+    if magic != MAGIC or not 1 <= version <= VERSION:
+        raise ValueError(f"Not a replay header at byte {pos}")
+    pos += HEADER.size
+    record = GameRecord(grid_size, chaos_frequency, undo_limit, special_chance, seed, version)
+
+    events = record.events
+    while pos < size:
+        byte = data[pos]
+        pos += 1
+        count = byte >> 6
+        if count:
+            for k in range(count):
+                events.append((byte >> (2 * k)) & 3)
+        elif byte == END:
+            if pos + END_STRUCT.size <= size:
+                record.final_score, record.final_moves = END_STRUCT.unpack_from(data, pos)
+            pos += END_STRUCT.size
+            break
+        else:
+            events.append(-byte)
+    return record, min(pos, size)
+
+
+def iter_games(data):
+    # (record, start, end) for every game in a log, start/end being byte offsets
+    pos = 0
+    while pos + HEADER.size <= len(data):
+        record, end = parse_game(data, pos)
+        yield record, pos, end
+        pos = end
+
+
+def parse(data):
+    """ Decode the games in a replay log (bytes), in order. """
+    return [record for record, _, _ in iter_games(data)]
+
+
+def read_games(path=REPLAY_PATH):
+    with open(path, "rb") as f:
+        return parse(f.read())
+
+
+def new_engine(record):
+    # Engine with the record's settings, at the start of its game
+    engine = GameEngine(record.grid_size, seed=record.seed)
+    engine.chaos_frequency = record.chaos_frequency
+    engine.undo_limit = record.undo_limit
+    engine.special_chance = record.special_chance
+    # Undo snapshots are only worth taking if the game uses them
+    engine.keep_history = -UNDO in record.events
+    engine.new_game(record.seed)
+    return engine
+
+
+def run_events(engine, events):
+    step = engine.step
+    for event in events:
+        if event >= 0:
+            step(DIRECTIONS[event])
+        elif event == -UNDO:
+            engine.undo_move()
+        elif event == -REDO:
+            engine.redo_move()
+        elif event == -CHAOS_ON:
+            engine.chaos_mode = True
+        elif event == -CHAOS_OFF:
+            engine.chaos_mode = False
+        elif event == -TIME_UP:
+            engine.game_over = True
+    return engine
+
+
+def replay(record, until=None):
+    """ Run a recorded game through the rules and return the engine.
+
+    until stops after that many events, to rebuild any position along the way.
+    """
+    events = record.events if until is None else record.events[:until]
+    return run_events(new_engine(record), events)
+
+
+def verify(record):
+    # True if replaying gives the recorded final score and move count
+    # (None if the game never ended or was played under older rules)
+    if record.final_score is None or record.version != VERSION:
+        return None
+    engine = replay(record)
+    return engine.score == record.final_score and engine.moves == record.final_moves
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="replay", description="Check and inspect replay logs.")
+    parser.add_argument("command", choices=["verify", "show"])
+    parser.add_argument("path", nargs="?", default=REPLAY_PATH)
+    parser.add_argument("--game", type=int, default=-1, help="game index for show (default: last)")
+    parser.add_argument("--move", type=int, default=None, help="show the board after this many events")
+    parser.add_argument("--workers", type=int, default=None, help="processes for verify (default: all cores)")
+    args = parser.parse_args(argv)
+
+    games = read_games(args.path)
+    if args.command == "verify":
+        start = time.perf_counter()
+        workers = args.workers or os.cpu_count() or 1
+        if workers > 1 and len(games) > 1:
+            # Games are independent, so verification spreads over cores
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                results = list(pool.map(verify, games, chunksize=max(1, len(games) // (workers * 4))))
+        else:
+            results = [verify(record) for record in games]
+
+        failed = 0
+        moves = 0
+        for index, (record, ok) in enumerate(zip(games, results)):
+            moves += record.moves
+            if ok is False:
+                failed += 1
+                print(f"game {index}: replay does not match the recorded score ({record})")
+        elapsed = time.perf_counter() - start
+        print(f"{len(games)} games, {moves} moves replayed in {elapsed:.2f}s "
+              f"({moves / elapsed if elapsed > 0 else 0:.0f} moves/sec), {failed} mismatches")
+        return 1 if failed else 0
+
+    record = games[args.game]
+    engine = replay(record, args.move)
+    print(record)
+    for row in engine.grid:
+        print(" ".join(f"{value:>6}" for value in row))
+    print(f"score {engine.score}, moves {engine.moves}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
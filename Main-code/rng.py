@@ -0,0 +1,99 @@
+""" Seeded random numbers for GameEngine.
+
+GameRandom is a counter-based generator: the n-th output is a SplitMix64
+hash of (key, n), so the whole state is two ints. That makes copying it for
+every engine clone nearly free, saving it with undo states is a tuple, and
+split() derives independent streams for parallel workers without drawing
+from the parent. The methods the engine uses (random, randint, randrange,
+choice, shuffle) behave like their random.Random counterparts, but the
+streams differ, so seeds are not interchangeable with the random module.
+"""
+
+import os
+
+_MASK = (1 << 64) - 1
+_GAMMA = 0x9E3779B97F4A7C15
+
+
+def _mix64(z):
+    # SplitMix64 finalizer
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK
+    return z ^ (z >> 31)
+
+
+def new_seed():
+    # Fresh 32-bit seed from the OS, short enough to show and type in the UI
+    return int.from_bytes(os.urandom(4), "big")
+
+
+class GameRandom:
+    __slots__ = ("key", "counter")
+
+    def __init__(self, seed=None):
+        self.seed(seed)
+
+    def seed(self, seed=None):
+        if seed is None:
+            seed = new_seed()
+        self.key = _mix64(seed & _MASK)
+        self.counter = 0
+
+    def getstate(self):
+        return self.key, self.counter
+
+    def setstate(self, state):
+        self.key, self.counter = state
+
+    def copy(self):
+        other = GameRandom.__new__(GameRandom)
+        other.key = self.key
+        other.counter = self.counter
+        return other
+
+    def split(self, stream):
+        # Independent generator for stream number `stream`; self is not advanced
+        other = GameRandom.__new__(GameRandom)
+        other.key = _mix64((self.key ^ _mix64((stream + 1) * _GAMMA & _MASK)) & _MASK)
+        other.counter = 0
+        return other
+
+    def next64(self):
+        self.counter += 1
+        return _mix64((self.key + self.counter * _GAMMA) & _MASK)
+
+    def getrandbits(self, k):
+        if k <= 64:
+            return self.next64() >> (64 - k) if k > 0 else 0
+        bits = 0
+        for shift in range(0, k, 64):
+            bits |= self.next64() << shift
+        return bits & ((1 << k) - 1)
+
+    def random(self):
+        # Float in [0, 1) with 53 random bits
+        return (self.next64() >> 11) * (1.0 / (1 << 53))
+
+    def randrange(self, n):
+        # Uniform int in [0, n), by rejection so every value is equally likely
+        if n <= 0:
+            raise ValueError("empty range for randrange()")
+        k = n.bit_length()
+        r = self.getrandbits(k)
+        while r >= n:
+            r = self.getrandbits(k)
+        return r
+
+    def randint(self, a, b):
+        return a + self.randrange(b - a + 1)
+
+    def choice(self, seq):
+        if not seq:
+            raise IndexError("Cannot choose from an empty sequence")
+        return seq[self.randrange(len(seq))]
+
+    def shuffle(self, x):
+        # Fisher-Yates, in place
+        for i in range(len(x) - 1, 0, -1):
+            j = self.randrange(i + 1)
+            x[i], x[j] = x[j], x[i]
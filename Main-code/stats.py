@@ -0,0 +1,273 @@
+""" High scores, game summaries and mission history, kept in SQLite.
+
+The window hands every finished game to a StatsStore. The store queues the
+game's summary, and a writer thread, the only one that touches the
+database, writes whatever has queued up in one transaction. Nothing on
+the Tk thread waits for the disk, not even opening the database: the
+writer opens it (WAL journal, so readers never block it), creates the
+tables and loads the best score of every mode, and the window picks those
+up when ready is set.
+
+A game counts for the most demanding mode it was played in at any point:
+timed, then chaos, then classic. High scores, leaderboards and percentiles
+are per mode and board size, read through the (mode, grid_size, score)
+index. Seeds keep the 64 bits GameRandom and the replay header use, stored
+as SQLite's signed INTEGER (see seed_to_db), so a leaderboard seed typed
+into Play Seed replays that game.
+
+    python stats.py top --mode chaos --limit 20
+    python stats.py percentiles --size 5
+    python stats.py missions
+"""
+
+import os
+import sys
+import time
+import queue
+import argparse
+import threading
+
+STATS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stats.db")
+
+MODES = ("classic", "chaos", "timed")
+PERCENTILES = (10, 25, 50, 75, 90, 99)
+# Most games written in one transaction; more stay queued for the next one
+BATCH_SIZE = 256
+SEED_MASK = 2 ** 64 - 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    mode TEXT NOT NULL,
+    grid_size INTEGER NOT NULL,
+    seed INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    moves INTEGER NOT NULL,
+    max_tile INTEGER NOT NULL,
+    outcome TEXT NOT NULL,
+    started REAL NOT NULL,
+    seconds REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS games_by_score ON games (mode, grid_size, score);
+CREATE TABLE IF NOT EXISTS missions (
+    game_id INTEGER NOT NULL REFERENCES games (id),
+    mission_type TEXT NOT NULL,
+    description TEXT NOT NULL,
+    reward TEXT NOT NULL,
+    move INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS missions_by_game ON missions (game_id);
+"""
+
+
+def connect(path=STATS_PATH):
+    """ Open (and if needed create) a stats database. """
+    # Imported here: it is slow to import, and the window only needs it on the writer thread
+    import sqlite3
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA journal_mode=WAL")
+    # WAL commits stay atomic without a sync each; a power cut can lose the last few games
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.executescript(SCHEMA)
+    return db
+
+
+def seed_to_db(seed):
+    # The seed's 64 bits as a signed 64-bit integer; seed & SEED_MASK gets them back
+    seed &= SEED_MASK
+    return seed - (1 << 64) if seed >> 63 else seed
+
+
+def game_mode(timed, chaos):
+    return "timed" if timed else "chaos" if chaos else "classic"
+
+
+class StatsStore:
+    """ Records the games an engine plays, written to SQLite off the caller's thread.
+
+    Call start_game(engine) after the engine starts a game, end_game() before
+    it starts the next one (it records the game, unless no move was played)
+    and close() when done. Subscribe mission_completed to the engine's
+    EventBus for the mission history.
+    """
+
+    def __init__(self, path=STATS_PATH):
+        self.path = path
+        self.ready = threading.Event()  # set once saved_best is loaded
+        self.error = None  # the database error that stopped the writer, if any
+        self.saved_best = {}  # (mode, grid_size) -> best score in the database
+        self.session_best = {}  # (mode, grid_size) -> best score recorded since
+        self.engine = None
+        self.game = None  # [started, timed, chaos, missions] of the game in progress
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name="stats-writer", daemon=True)
+        self.thread.start()
+
+    def start_game(self, engine):
+        self.end_game()  # in case the last one wasn't ended
+        self.engine = engine
+        self.game = [time.time(), engine.timed_mode, engine.chaos_mode, []]
+
+    def note_mode(self, engine):
+        # Timed or chaos mode was switched on or off; the game keeps the harder mode
+        if self.game is not None:
+            self.game[1] |= engine.timed_mode
+            self.game[2] |= engine.chaos_mode
+
+    def game_mode(self):
+        if self.game is None:
+            return "classic"
+        return game_mode(self.game[1], self.game[2])
+
+    def mission_completed(self, event):
+        # EventBus handler for MissionCompleted
+        if self.game is not None:
+            self.game[3].append((event.mission_type, event.description, event.reward, self.engine.moves))
+
+    def end_game(self):
+        if self.game is None:
+            return
+        engine = self.engine
+        started, timed, chaos, missions = self.game
+        self.game = None
+        if not engine.moves and not engine.game_over:
+            return
+
+        if not engine.game_over:
+            outcome = "quit"
+        elif engine.timed_mode and engine.time_left == 0:
+            outcome = "time up"
+        else:
+            outcome = "game over"
+        mode = game_mode(timed or engine.timed_mode, chaos or engine.chaos_mode)
+        key = (mode, engine.GRID_SIZE)
+        if engine.score > self.session_best.get(key, 0):
+            self.session_best[key] = engine.score
+        self.queue.put(((mode, engine.GRID_SIZE, seed_to_db(engine.seed), engine.score, engine.moves,
+                         engine.get_highest_tile(), outcome, started, time.time() - started), missions))
+
+    def high_score(self, mode, grid_size):
+        # Best of the saved scores (once loaded) and this session's
+        key = (mode, grid_size)
+        return max(self.saved_best.get(key, 0), self.session_best.get(key, 0))
+
+    def flush(self):
+        # Wait until every recorded game is in the database
+        self.queue.join()
+
+    def close(self):
+        self.end_game()
+        self.queue.put(None)
+        self.thread.join()
+
+    def run(self):
+        # Writer thread: owns the connection, writes what has queued up per transaction
+        import sqlite3
+        db = None
+        try:
+            db = connect(self.path)
+            self.saved_best = {(mode, grid_size): score for mode, grid_size, score in db.execute(
+                "SELECT mode, grid_size, MAX(score) FROM games GROUP BY mode, grid_size")}
+        except sqlite3.Error as exc:
+            self.report(exc)
+        self.ready.set()
+
+        stop = False
+        while not stop:
+            batch = [self.queue.get()]
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            games = [item for item in batch if item is not None]
+            if games and self.error is None:
+                try:
+                    with db:
+                        for summary, missions in games:
+                            game_id = db.execute(
+                                "INSERT INTO games (mode, grid_size, seed, score, moves, max_tile, outcome, "
+                                "started, seconds) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", summary).lastrowid
+                            db.executemany(
+                                "INSERT INTO missions (game_id, mission_type, description, reward, move) "
+                                "VALUES (?, ?, ?, ?, ?)", [(game_id,) + mission for mission in missions])
+                except sqlite3.Error as exc:
+                    self.report(exc)
+            for _ in batch:
+                self.queue.task_done()
+        if db is not None:
+            db.close()
+
+    def report(self, exc):
+        # A broken database costs the stats, not the game: note it once and stop writing
+        self.error = exc
+        print(f"stats: {self.path}: {exc}; games are no longer recorded", file=sys.stderr)
+
+
+def leaderboard(db, mode="classic", grid_size=4, limit=10):
+    """ The best `limit` games as (score, max_tile, moves, seed, started) rows. """
+    rows = db.execute(
+        "SELECT score, max_tile, moves, seed, started FROM games WHERE mode = ? AND grid_size = ? "
+        "ORDER BY score DESC LIMIT ?", (mode, grid_size, limit))
+    return [(score, max_tile, moves, seed & SEED_MASK, started) for score, max_tile, moves, seed, started in rows]
+
+
+def percentiles(db, mode="classic", grid_size=4, pcts=PERCENTILES):
+    """ Nearest-rank score percentiles, {pct: score}, empty when no game was recorded. """
+    count, = db.execute("SELECT COUNT(*) FROM games WHERE mode = ? AND grid_size = ?",
+                        (mode, grid_size)).fetchone()
+    result = {}
+    if not count:
+        return result
+    for pct in pcts:
+        rank = max(1, -(-pct * count // 100))
+        result[pct], = db.execute(
+            "SELECT score FROM games WHERE mode = ? AND grid_size = ? ORDER BY score LIMIT 1 OFFSET ?",
+            (mode, grid_size, rank - 1)).fetchone()
+    return result
+
+
+def score_rank(db, score, mode="classic", grid_size=4):
+    """ Fraction of recorded games that scored less than `score`. """
+    total, = db.execute("SELECT COUNT(*) FROM games WHERE mode = ? AND grid_size = ?",
+                        (mode, grid_size)).fetchone()
+    below, = db.execute("SELECT COUNT(*) FROM games WHERE mode = ? AND grid_size = ? AND score < ?",
+                        (mode, grid_size, score)).fetchone()
+    return below / total if total else 0.0
+
+
+def mission_history(db):
+    """ (mission type, times completed, games it was completed in) rows, most completed first. """
+    return db.execute(
+        "SELECT mission_type, COUNT(*), COUNT(DISTINCT game_id) FROM missions "
+        "GROUP BY mission_type ORDER BY COUNT(*) DESC").fetchall()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="stats", description="Show recorded high scores and stats.")
+    parser.add_argument("command", choices=["top", "percentiles", "missions"])
+    parser.add_argument("path", nargs="?", default=STATS_PATH)
+    parser.add_argument("--mode", choices=MODES, default="classic")
+    parser.add_argument("--size", type=int, default=4, help="grid size (default: 4)")
+    parser.add_argument("--limit", type=int, default=10, help="games listed by top")
+    args = parser.parse_args(argv)
+
+    db = connect(args.path)
+    if args.command == "top":
+        for place, (score, max_tile, moves, seed, started) in enumerate(
+                leaderboard(db, args.mode, args.size, args.limit), 1):
+            print(f"{place:>3}. {score:>8}  tile {max_tile:>5}  {moves:>5} moves  seed {seed}  "
+                  f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(started))}")
+    elif args.command == "percentiles":
+        result = percentiles(db, args.mode, args.size)
+        print("  ".join(f"p{pct}={score}" for pct, score in result.items()) or "no games recorded")
+    else:
+        for mission_type, completed, games in mission_history(db):
+            print(f"{mission_type:>12}: completed {completed} times in {games} games")
+    db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,265 @@
+""" Self-play tournament: many headless games per policy across a process pool.
+
+Every game is played by a worker process on its own GameEngine started
+from the game's seed, and the policy breaks ties with a stream split off
+that seed, so a (policy, seed) pair always plays the same game.
+Workers send back one small tuple per game and the parent aggregates them
+into score percentiles, time to 2048, mission completion rates and
+throughput. Nothing here imports Tkinter.
+
+Run it directly or through the game's entry point:
+
+    python tournament.py --games 200 --policies random greedy expectimax
+    python Enhanced-2048.py tournament --games 200
+    python tournament.py --size 8 --policies greedy   # 8x8 boards
+"""
+
+import os
+import sys
+import time
+import json
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from game_engine import GameEngine, DIRECTIONS, DEFAULT_MISSIONS
+from hint_engine import HintEngine, evaluate
+from rng import GameRandom
+
+POLICIES = ["random", "greedy", "expectimax"]
+MISSION_TYPES = [m["type"] for m in DEFAULT_MISSIONS]
+PERCENTILES = (10, 25, 50, 75, 90, 99)
+
+# Per-process search engine for the expectimax policy, kept between games
+_hint_engine = None
+
+
+def legal_moves(engine):
+    # (direction, engine after the move) for every direction that changes the board
+    moves = []
+    for direction in DIRECTIONS:
+        child = engine.clone()
+        if child.move(direction):
+            moves.append((direction, child))
+    return moves
+
+
+def random_policy(engine, moves, rng, search):
+    return rng.choice(moves)[0]
+
+
+def greedy_policy(engine, moves, rng, search):
+    # Best score gained by the move itself, then the heuristic, ties broken at random
+    return max(moves, key=lambda move: (move[1].score, evaluate(move[1].grid), rng.random()))[0]
+
+
+def expectimax_policy(engine, moves, rng, search):
+    global _hint_engine
+    if _hint_engine is None or (_hint_engine.max_depth, _hint_engine.min_probability) != search:
+        # No time budget, so the same position always gets the same move
+        depth, min_probability = search
+        _hint_engine = HintEngine(max_depth=depth, time_budget=float("inf"), min_probability=min_probability)
+    return _hint_engine.search(engine).direction or moves[0][0]
+
+
+_POLICY_FUNCTIONS = {
+    "random": random_policy,
+    "greedy": greedy_policy,
+    "expectimax": expectimax_policy,
+}
+
+
+def play_game(policy, seed, max_moves=10000, depth=2, min_probability=0.01, chaos_mode=False, grid_size=4):
+    """ Play one game and return its record.
+
+    The record is a tuple (policy, seed, score, moves, max_tile, moves_to_2048,
+    seconds_to_2048, seconds, missions_assigned, missions_completed), with -1
+    for the 2048 fields when the tile was never reached and the mission
+    fields as per-type counts in MISSION_TYPES order.
+    """
+    choose = _POLICY_FUNCTIONS[policy]
+    rng = GameRandom(seed).split(1)
+
+    start = time.perf_counter()
+    engine = GameEngine(grid_size, seed=seed)
+    engine.chaos_mode = chaos_mode
+    engine.undo_limit = 0
+    engine.new_game(seed)
+
+    assigned = [0] * len(MISSION_TYPES)
+    completed = [0] * len(MISSION_TYPES)
+    assigned[MISSION_TYPES.index(engine.current_mission["type"])] += 1
+    moves_to_2048 = -1
+    seconds_to_2048 = -1.0
+
+    while not engine.game_over and engine.moves < max_moves:
+        moves = legal_moves(engine)
+        if not moves:
+            break  # frozen tiles can block every move without the game being over
+
+        mission = engine.current_mission
+        result = engine.step(choose(engine, moves, rng, (depth, min_probability)))
+        if mission is not engine.current_mission:
+            completed[MISSION_TYPES.index(mission["type"])] += 1
+            assigned[MISSION_TYPES.index(engine.current_mission["type"])] += 1
+        if engine.game_won and moves_to_2048 < 0:
+            moves_to_2048 = engine.moves
+            seconds_to_2048 = time.perf_counter() - start
+        if result.game_over:
+            break
+
+    return (policy, seed, engine.score, engine.moves, engine.get_highest_tile(),
+            moves_to_2048, seconds_to_2048, time.perf_counter() - start,
+            tuple(assigned), tuple(completed))
+
+
+def play_batch(policy, seeds, max_moves, depth, min_probability, chaos_mode, grid_size=4):
+    # Worker entry point: several games per task keeps the pool overhead small
+    return [play_game(policy, seed, max_moves, depth, min_probability, chaos_mode, grid_size) for seed in seeds]
+
+
+def percentile(sorted_values, pct):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return None
+    rank = max(1, -(-pct * len(sorted_values) // 100))
+    return sorted_values[rank - 1]
+
+
+def summarize(records, elapsed):
+    """ Aggregate game records into per-policy statistics. """
+    by_policy = {}
+    for record in records:
+        by_policy.setdefault(record[0], []).append(record)
+
+    summary = {}
+    for policy, games in by_policy.items():
+        scores = sorted(r[2] for r in games)
+        won = [r for r in games if r[5] >= 0]
+        assigned = [sum(r[8][k] for r in games) for k in range(len(MISSION_TYPES))]
+        completed = [sum(r[9][k] for r in games) for k in range(len(MISSION_TYPES))]
+        tiles = {}
+        for r in games:
+            tiles[r[4]] = tiles.get(r[4], 0) + 1
+
+        summary[policy] = {
+            "games": len(games),
+            "score_mean": sum(scores) / len(scores),
+            "score_percentiles": {p: percentile(scores, p) for p in PERCENTILES},
+            "moves_mean": sum(r[3] for r in games) / len(games),
+            "max_tiles": dict(sorted(tiles.items())),
+            "reached_2048": len(won) / len(games),
+            "moves_to_2048_median": percentile(sorted(r[5] for r in won), 50),
+            "seconds_to_2048_median": percentile(sorted(r[6] for r in won), 50),
+            "mission_completion": {
+                mission_type: (completed[k] / assigned[k] if assigned[k] else 0.0)
+                for k, mission_type in enumerate(MISSION_TYPES)
+            },
+            "missions_per_game": sum(completed) / len(games),
+            "cpu_seconds": sum(r[7] for r in games),
+        }
+
+    total = len(records)
+    return {
+        "games": total,
+        "seconds": elapsed,
+        "games_per_second": total / elapsed if elapsed > 0 else 0.0,
+        "policies": summary,
+    }
+
+
+def run_tournament(policies, games, seed=0, workers=None, max_moves=10000, depth=2,
+                   min_probability=0.01, chaos_mode=False, batch_size=None, progress=None, grid_size=4):
+    """ Play `games` games per policy and return (records, summary).
+
+    Game k of every policy uses seed + k, so policies are compared on the
+    same spawn sequence as far as their moves allow. progress, if given, is
+    called with the number of finished games as batches come back.
+    """
+    for policy in policies:
+        if policy not in _POLICY_FUNCTIONS:
+            raise ValueError(f"Unknown policy {policy!r}, expected one of {POLICIES}")
+
+    workers = workers or os.cpu_count() or 1
+    seeds = [seed + k for k in range(games)]
+    if batch_size is None:
+        # A few batches per worker balances load without flooding the pool with tasks
+        batch_size = max(1, games * len(policies) // (workers * 4))
+    tasks = [(policy, seeds[k:k + batch_size]) for policy in policies
+             for k in range(0, games, batch_size)]
+
+    records = []
+    start = time.perf_counter()
+    if workers == 1:
+        for policy, batch in tasks:
+            records.extend(play_batch(policy, batch, max_moves, depth, min_probability, chaos_mode, grid_size))
+            if progress:
+                progress(len(records))
+    else:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            futures = [pool.submit(play_batch, policy, batch, max_moves, depth,
+                                   min_probability, chaos_mode, grid_size)
+                       for policy, batch in tasks]
+            for future in as_completed(futures):
+                records.extend(future.result())
+                if progress:
+                    progress(len(records))
+    elapsed = time.perf_counter() - start
+
+    records.sort(key=lambda r: (policies.index(r[0]), r[1]))
+    return records, summarize(records, elapsed)
+
+
+def format_summary(summary):
+    lines = [f"{summary['games']} games in {summary['seconds']:.1f}s "
+             f"({summary['games_per_second']:.1f} games/sec)"]
+    for policy, stats in summary["policies"].items():
+        pct = stats["score_percentiles"]
+        lines.append("")
+        lines.append(f"{policy}: {stats['games']} games, mean score {stats['score_mean']:.0f}, "
+                     f"mean moves {stats['moves_mean']:.0f}")
+        lines.append("  score " + "  ".join(f"p{p}={pct[p]}" for p in PERCENTILES))
+        lines.append("  max tile " + "  ".join(f"{tile}: {count}" for tile, count in stats["max_tiles"].items()))
+        if stats["moves_to_2048_median"] is None:
+            lines.append("  2048: never reached")
+        else:
+            lines.append(f"  2048: {stats['reached_2048']:.1%} of games, median "
+                         f"{stats['moves_to_2048_median']} moves / {stats['seconds_to_2048_median']:.2f}s")
+        lines.append("  missions " + "  ".join(f"{t}={rate:.1%}" for t, rate in stats["mission_completion"].items())
+                     + f"  ({stats['missions_per_game']:.2f} per game)")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="tournament", description="Compare move policies over many seeded games.")
+    parser.add_argument("--games", type=int, default=100, help="games per policy")
+    parser.add_argument("--policies", nargs="+", default=POLICIES, choices=POLICIES)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--max-moves", type=int, default=10000, help="stop a game after this many moves")
+    parser.add_argument("--depth", type=int, default=2, help="search depth of the expectimax policy")
+    parser.add_argument("--min-probability", type=float, default=0.01,
+                        help="expectimax skips spawns less likely than this (special tiles, mostly)")
+    parser.add_argument("--chaos", action="store_true", help="play with chaos mode on")
+    parser.add_argument("--size", type=int, default=4, help="grid size (default: 4)")
+    parser.add_argument("--json", metavar="PATH", help="also write the summary and records as JSON")
+    args = parser.parse_args(argv)
+
+    def progress(done):
+        print(f"\r{done}/{args.games * len(args.policies)} games", end="", file=sys.stderr, flush=True)
+
+    records, summary = run_tournament(args.policies, args.games, args.seed, args.workers,
+                                      args.max_moves, args.depth, args.min_probability, args.chaos,
+                                      progress=progress, grid_size=args.size)
+    print(file=sys.stderr)
+    print(format_summary(summary))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"summary": summary, "records": records}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+""" Zobrist hashing for GameEngine positions.
+
+Every (cell, tile value) pair and every (cell, special type, turns left)
+triple gets a random 64-bit key; a position's hash is the XOR of the keys of
+everything on the board. Because XOR undoes itself, the engine keeps the
+hash up to date one cell at a time as tiles merge, spawn, get cleared by
+bombs or swapped, instead of rehashing the whole board.
+"""
+
+import random
+
+# Tile values that get keys up front (2 ** 1 .. 2 ** 17); larger ones are added on demand
+_PREBUILT_EXPONENTS = 17
+
+
+class ZobristKeys:
+    def __init__(self, grid_size=4, seed=2048):
+        self.grid_size = grid_size
+        self._rng = random.Random(seed)
+        cells = grid_size * grid_size
+        self._value_keys = [
+            {1 << e: self._rng.getrandbits(64) for e in range(1, _PREBUILT_EXPONENTS + 1)}
+            for _ in range(cells)
+        ]
+        self._special_keys = [{} for _ in range(cells)]
+
+    def value_key(self, i, j, value):
+        # Empty cells contribute nothing to the hash
+        if value == 0:
+            return 0
+        keys = self._value_keys[i * self.grid_size + j]
+        key = keys.get(value)
+        if key is None:
+            key = keys[value] = self._rng.getrandbits(64)
+        return key
+
+    def special_key(self, pos, special_type, turns):
+        if special_type is None:
+            return 0
+        i, j = pos
+        keys = self._special_keys[i * self.grid_size + j]
+        special = (special_type, turns)
+        key = keys.get(special)
+        if key is None:
+            key = keys[special] = self._rng.getrandbits(64)
+        return key
+
+    def full_hash(self, grid, special_tiles):
+        # Hash a position from scratch
+        h = 0
+        for i, row in enumerate(grid):
+            for j, value in enumerate(row):
+                h ^= self.value_key(i, j, value)
+        for pos, info in special_tiles.items():
+            h ^= self.special_key(pos, info['type'], info['turns'])
+        return h